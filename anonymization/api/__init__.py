@@ -9,3 +9,4 @@
 #
 
 from .anonym_api import load_and_anonymize  # noqa: F401
+from .batch import anonymize_files  # noqa: F401
@@ -8,12 +8,25 @@
 # anonymization: Text ner and pii
 #
 
+import os
+
 import openpyxl
 import pandas as pd
 
+from anonymization.api.arrow_io import anonymize_csv_arrow
+from anonymization.api.arrow_io import anonymize_feather
+from anonymization.api.arrow_io import anonymize_parquet
+from anonymization.api.journal import Journal
+from anonymization.api.shared_strings import anonymize_xlsx_shared_strings
+from anonymization.api.text_stream import anonymize_text_stream
 from anonymization.pii import Anonymize
 from anonymization.pii import PIIDetection
 from anonymization.pii.anonym_ops import gen_operators
+from anonymization.pii.prescreen import PreScreen
+from anonymization.pii.pseudonym_store import make_pseudonym_store
+
+CSV_ENGINES = ["pandas", "pyarrow"]
+SUPPORTED_FORMATS = ["csv", "xlsx", "parquet", "feather", "arrow", "txt"]
 
 
 class Anonymizer:
@@ -23,7 +36,9 @@ class Anonymizer:
         """
         self.config = config
         self.detector = PIIDetection(config)
-        self.anonym = Anonymize(operators=gen_operators(self.config))
+        self.prescreen = PreScreen(config)
+        self.store = make_pseudonym_store(config)
+        self.anonym = Anonymize(operators=gen_operators(self.config, self.store))
 
     def __call__(self, cell_value):
         """
@@ -36,11 +51,343 @@ class Anonymizer:
             The anonymized cell value.
         """
         text = str(cell_value)
-        if not text.strip():
+        if not text.strip() or self.prescreen.skip(cell_value):
             return text
         results = self.detector.analyse(text)
         return self.anonym.anonymise(text, results)
 
+    def close(self):
+        """
+        Release the models held by the detector and close the pseudonym store.
+        """
+        self.detector.close()
+        self.store.close()
+
+    def anonymize_batch(self, cell_values):
+        """
+        Perform anonymization on a list of cell values.
+
+        The values that pass the pre-screening are analysed together with
+        `PIIDetection.analyse_batch`, which is much faster than calling the anonymizer
+        on each value.
+
+        Parameters:
+            cell_values (list): The values of the cells to anonymize.
+
+        Returns:
+            list: The anonymized cell values, in the input order.
+        """
+        texts = [str(value) for value in cell_values]
+        indices = [
+            i
+            for i, text in enumerate(texts)
+            if text.strip() and not self.prescreen.skip(cell_values[i])
+        ]
+        results = self.detector.analyse_batch([texts[i] for i in indices])
+        for i, res in zip(indices, results):
+            texts[i] = self.anonym.anonymise(texts[i], res)
+        return texts
+
+
+def anonymize_dataframe(df, anonymizer, columns):
+    """
+    Anonymize the specified columns of a DataFrame in place.
+
+    Each column is factorized, so that each distinct value is anonymized once, and the
+    anonymized values are mapped back to the rows.
+
+    Parameters:
+        df (pandas.DataFrame): The data.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices of the columns to anonymize.
+    """
+    for c in columns:
+        if c < len(df.columns):
+            codes, uniques = pd.factorize(df.iloc[:, c], use_na_sentinel=False)
+            values = pd.Series(anonymizer.anonymize_batch(list(uniques)), dtype=object)
+            df.isetitem(c, values.take(codes).to_numpy())
+
+
+def anonymize_csv(
+    file_name,
+    anonymized_file_name,
+    anonymizer,
+    columns,
+    chunksize=None,
+    journal=None,
+    resume=False,
+):
+    """
+    Anonymize the specified columns of a CSV file.
+
+    The file is read by chunks of `chunksize` rows, and each anonymized chunk is appended to
+    the output file, so that the memory usage does not depend on the file size. With a
+    journal, the number of rows and bytes written is recorded after each chunk, so that an
+    interrupted run can be resumed.
+
+    Parameters:
+        file_name (str): The CSV file.
+        anonymized_file_name (str): The output CSV file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices of the columns to anonymize.
+        chunksize (int, optional): Number of rows read at once. Default is None (whole file).
+        journal (Journal, optional): The journal of the output file. Default is None.
+        resume (bool, optional): Whether to continue after the last checkpoint of the journal.
+            Default is False.
+    """
+    done = 0
+    state = journal.last() if resume and journal is not None else None
+    if state is not None:
+        # Drop what was written after the last checkpoint
+        done = state["rows"]
+        with open(anonymized_file_name, "r+b") as file:
+            file.truncate(state["bytes"])
+
+    # The values are read as text, so that the columns that are not processed are written
+    # as they are, whatever the types pandas would infer for each chunk
+    options = dict(dtype=str, keep_default_na=False)
+    if chunksize is None:
+        chunks = [pd.read_csv(file_name, **options)]
+    else:
+        chunks = pd.read_csv(file_name, chunksize=chunksize, **options)
+    rows = 0
+    for df in chunks:
+        start = rows
+        rows += len(df)
+        if start < done:
+            # Skip the rows already written
+            skip = min(done - start, len(df))
+            df = df.iloc[skip:]
+            if df.empty:
+                continue
+        anonymize_dataframe(df, anonymizer, columns)
+        first = start == 0 and done == 0
+        df.to_csv(
+            anonymized_file_name, index=False, mode="w" if first else "a", header=first
+        )
+        if journal is not None:
+            journal.checkpoint(rows=rows, bytes=os.path.getsize(anonymized_file_name))
+
+
+def anonymize_xlsx(file_name, anonymized_file_name, anonymizer, columns):
+    """
+    Anonymize the specified columns of all the sheets of an Excel file.
+
+    The whole workbook is loaded, so that the formatting is kept.
+
+    Parameters:
+        file_name (str): The Excel file.
+        anonymized_file_name (str): The output Excel file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices (starting at 1) of the columns to anonymize.
+    """
+    # Load the Excel file
+    workbook = openpyxl.load_workbook(file_name)
+    # Iterate through all sheets
+    for sheet_name in workbook.sheetnames:
+        sheet = workbook[sheet_name]
+
+        # Collect the cells of the processed columns
+        cells = []
+        for row in sheet.iter_rows(
+            min_row=1, max_row=sheet.max_row, min_col=1, max_col=sheet.max_column
+        ):
+            for cell in row:
+                if cell.value and cell.column in columns:
+                    cells.append(cell)
+
+        # Anonymize them in batches
+        values = anonymizer.anonymize_batch([cell.value for cell in cells])
+        for cell, value in zip(cells, values):
+            cell.value = value
+
+    # Save the modified Excel file
+    workbook.save(anonymized_file_name)
+
+
+def _anonymize_rows(rows, anonymizer, columns):
+    """
+    Anonymize the specified columns of a list of rows (lists of values) in place.
+    """
+    for c in columns:
+        cells = [row for row in rows if c <= len(row) and row[c - 1]]
+        values = anonymizer.anonymize_batch([row[c - 1] for row in cells])
+        for row, value in zip(cells, values):
+            row[c - 1] = value
+
+
+def anonymize_xlsx_streaming(
+    file_name, anonymized_file_name, anonymizer, columns, chunksize=10000
+):
+    """
+    Anonymize the specified columns of all the sheets of a large Excel file.
+
+    The workbook is read in read-only mode and written in write-only mode, by chunks of
+    `chunksize` rows, so that the memory usage does not depend on the file size. The sheets,
+    values and column layout are kept, but not the formatting.
+
+    Parameters:
+        file_name (str): The Excel file.
+        anonymized_file_name (str): The output Excel file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices (starting at 1) of the columns to anonymize.
+        chunksize (int, optional): Number of rows anonymized at once. Default is 10000.
+    """
+    reader = openpyxl.load_workbook(file_name, read_only=True)
+    writer = openpyxl.Workbook(write_only=True)
+    for sheet_name in reader.sheetnames:
+        sheet = writer.create_sheet(sheet_name)
+        rows = []
+        for row in reader[sheet_name].iter_rows(values_only=True):
+            rows.append(list(row))
+            if len(rows) == chunksize:
+                _anonymize_rows(rows, anonymizer, columns)
+                for r in rows:
+                    sheet.append(r)
+                rows = []
+        _anonymize_rows(rows, anonymizer, columns)
+        for r in rows:
+            sheet.append(r)
+    reader.close()
+    writer.save(anonymized_file_name)
+
+
+def anonymized_path(file_name, output_dir=None):
+    """
+    Get the default path of the anonymized version of a file: "_anonymized" appended to the
+    file name before the extension.
+
+    Parameters:
+        file_name (str): The input file.
+        output_dir (str, optional): Directory of the output file. Default is the directory
+            of the input file.
+
+    Returns:
+        str: The path of the anonymized file.
+    """
+    root, extension = os.path.splitext(file_name)
+    anonymized_file_name = f"{root}_anonymized{extension}"
+    if output_dir is not None:
+        anonymized_file_name = os.path.join(
+            output_dir, os.path.basename(anonymized_file_name)
+        )
+    return anonymized_file_name
+
+
+def anonymize_file(file_name, anonymizer, anonymized_file_name=None, resume=False):
+    """
+    Anonymize a file with an existing anonymizer, so that the models are loaded only once
+    for several files.
+
+    Parameters:
+        file_name (str): The name of the file to be anonymized.
+        Supported formats: CSV, Excel (XLSX), Parquet, Arrow IPC (FEATHER, ARROW)
+        or text (TXT).
+        anonymizer (Anonymizer): The anonymizer, whose configuration is used.
+        anonymized_file_name (str, optional): The output file. Default is given by
+            `anonymized_path`.
+        resume (bool, optional): Whether to continue a partial output file from the last
+            checkpoint of its journal (CSV files read by chunks), the other files are
+            anonymized again. Default is False.
+
+    Returns:
+        str: The path of the anonymized file.
+    """
+    config = anonymizer.config
+    # Detect the file format based on the extension
+    file_extension = os.path.splitext(file_name)[1][1:].lower()
+    columns = config.get("process_columns", [])
+    csv_engine = config.get("csv_engine", "pandas")
+    if csv_engine not in CSV_ENGINES:
+        raise ValueError(f"Unsupported csv engine: {csv_engine}")
+    if file_extension not in SUPPORTED_FORMATS:
+        raise ValueError(f"Unsupported file format: {file_extension}")
+
+    if anonymized_file_name is None:
+        anonymized_file_name = anonymized_path(file_name)
+    journal = Journal(anonymized_file_name)
+    resume = resume and journal.exists()
+    if not resume:
+        journal.start()
+    if file_extension == "csv" and csv_engine == "pyarrow":
+        anonymize_csv_arrow(
+            file_name,
+            anonymized_file_name,
+            anonymizer,
+            columns,
+            journal=journal,
+            resume=resume,
+        )
+    elif file_extension == "csv":
+        anonymize_csv(
+            file_name,
+            anonymized_file_name,
+            anonymizer,
+            columns,
+            chunksize=config.get("csv_chunksize", 10000),
+            journal=journal,
+            resume=resume,
+        )
+    elif file_extension == "parquet":
+        anonymize_parquet(file_name, anonymized_file_name, anonymizer, columns)
+    elif file_extension in ["feather", "arrow"]:
+        anonymize_feather(file_name, anonymized_file_name, anonymizer, columns)
+    elif file_extension == "xlsx":
+        xlsx_mode = config.get("xlsx_mode", "full")
+        if xlsx_mode == "full":
+            anonymize_xlsx(file_name, anonymized_file_name, anonymizer, columns)
+        elif xlsx_mode == "streaming":
+            anonymize_xlsx_streaming(
+                file_name, anonymized_file_name, anonymizer, columns
+            )
+        elif xlsx_mode == "shared_strings":
+            anonymize_xlsx_shared_strings(
+                file_name, anonymized_file_name, anonymizer, columns
+            )
+        else:
+            raise ValueError(f"Unsupported xlsx mode: {xlsx_mode}")
+    elif file_extension == "txt":
+        txt_mode = config.get("txt_mode", "full")
+        if txt_mode not in ["full", "stream"]:
+            raise ValueError(f"Unsupported txt mode: {txt_mode}")
+        if txt_mode == "stream" or anonymizer.detector.workers > 1:
+            anonymize_text_stream(
+                file_name,
+                anonymized_file_name,
+                anonymizer,
+                journal=journal,
+                resume=resume,
+            )
+        else:
+            with open(file_name, "r") as file:
+                text = anonymizer(file.read())
+            with open(anonymized_file_name, "w") as file:
+                file.write(text)
+    journal.finish()
+    return anonymized_file_name
+
+
+def print_stats(anonymizer, file=None):
+    """
+    Print the statistics of the analysis cache and of the pre-screening.
+
+    Parameters:
+        anonymizer (Anonymizer): The anonymizer.
+        file (file, optional): The output stream. Default is `sys.stdout`.
+    """
+    if anonymizer.detector.cache is not None:
+        stats = anonymizer.detector.cache.stats()
+        print(
+            f"Analysis cache: {stats['hits']} hits, {stats['misses']} misses", file=file
+        )
+    if anonymizer.prescreen.enabled:
+        stats = anonymizer.prescreen.stats()
+        print(
+            f"Pre-screening: {stats['skipped']} of {stats['checked']} distinct values "
+            "skipped",
+            file=file,
+        )
+
 
 def load_and_anonymize(file_name, config):
     """
@@ -49,7 +396,8 @@ def load_and_anonymize(file_name, config):
 
     Parameters:
         file_name (str): The name of the file to be loaded.
-        Supported formats: CSV, Excel (XLSX), or text (TXT).
+        Supported formats: CSV, Excel (XLSX), Parquet, Arrow IPC (FEATHER, ARROW)
+        or text (TXT).
         config (dict): Anonymization configuration.
 
     Returns:
@@ -57,43 +405,8 @@ def load_and_anonymize(file_name, config):
         to a new file with "anonymized" appended to the original file name
               before the extension. No explicit return value.
     """
-    # Detect the file format based on the extension
-    file_extension = file_name.split(".")[-1].lower()
-    columns = config.get("process_columns", [])
-
     anonymizer = Anonymizer(config)
-    anonymized_file_name = file_name.replace(
-        f".{file_extension}", f"_anonymized.{file_extension}"
-    )
-    if file_extension == "csv":
-        df = pd.read_csv(file_name)
-        for c in columns:
-            if c < len(df.columns):
-                df.iloc[:, c] = df.iloc[:, c].apply(anonymizer)
-        df.to_csv(anonymized_file_name, index=False)
-    elif file_extension == "xlsx":
-        # Load the Excel file
-        workbook = openpyxl.load_workbook(file_name)
-        # Iterate through all sheets
-        for sheet_name in workbook.sheetnames:
-            sheet = workbook[sheet_name]
-
-            # Iterate through all rows and columns of the sheet
-            for row in sheet.iter_rows(
-                min_row=1, max_row=sheet.max_row, min_col=1, max_col=sheet.max_column
-            ):
-                for cell in row:
-                    if cell.value and cell.column in columns:
-                        anonymizer.current_column_name = cell.column_letter
-                        cell.value = anonymizer(cell.value)
-
-        # Save the modified Excel file
-        workbook.save(anonymized_file_name)
-    elif file_extension == "txt":
-        with open(file_name, "r") as file:
-            text = anonymizer(file.read())
-        with open(anonymized_file_name, "w") as file:
-            file.write(text)
-    else:
-        raise ValueError(f"Unsupported file format: {file_extension}")
+    anonymized_file_name = anonymize_file(file_name, anonymizer)
     print(f"Anonymized data saved to '{anonymized_file_name}'")
+    print_stats(anonymizer)
+    anonymizer.close()
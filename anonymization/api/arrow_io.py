@@ -0,0 +1,191 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import csv
+import os
+
+
+def _import_pyarrow():
+    """
+    Import pyarrow, which is an optional dependency.
+    """
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "Parquet, Arrow and the pyarrow CSV engine require pyarrow: "
+            "pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+def anonymized_schema(schema, columns):
+    """
+    Get the schema of the anonymized data: the processed columns become strings.
+
+    Parameters:
+        schema (pyarrow.Schema): The schema of the input data.
+        columns (list): Indices of the columns to anonymize.
+
+    Returns:
+        pyarrow.Schema: The schema of the output data.
+    """
+    pa = _import_pyarrow()
+    for c in columns:
+        if c < len(schema):
+            schema = schema.set(c, schema.field(c).with_type(pa.string()))
+    return schema
+
+
+def anonymize_table(table, anonymizer, columns, schema):
+    """
+    Anonymize the specified columns of an Arrow table.
+
+    Each column is dictionary encoded, so that each distinct value is anonymized once, and
+    the anonymized values are mapped back to the rows with a take. Missing values stay
+    missing and the other columns are passed through without copy.
+
+    Parameters:
+        table (pyarrow.Table): The data.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices of the columns to anonymize.
+        schema (pyarrow.Schema): The output schema, see `anonymized_schema`.
+
+    Returns:
+        pyarrow.Table: The anonymized data.
+    """
+    pa = _import_pyarrow()
+    for c in columns:
+        if c >= table.num_columns:
+            continue
+        column = table.column(c).combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = column.dictionary_encode()
+        values = anonymizer.anonymize_batch(column.dictionary.to_pylist())
+        values = pa.array(values, type=pa.string()).take(column.indices)
+        table = table.set_column(c, schema.field(c), values)
+    return table
+
+
+def anonymize_parquet(file_name, anonymized_file_name, anonymizer, columns):
+    """
+    Anonymize the specified columns of a Parquet file, one row group at a time.
+
+    Parameters:
+        file_name (str): The Parquet file.
+        anonymized_file_name (str): The output Parquet file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices of the columns to anonymize.
+    """
+    _import_pyarrow()
+    import pyarrow.parquet as pq
+
+    reader = pq.ParquetFile(file_name, memory_map=True)
+    schema = anonymized_schema(reader.schema_arrow, columns)
+    with pq.ParquetWriter(anonymized_file_name, schema) as writer:
+        for i in range(reader.num_row_groups):
+            table = reader.read_row_group(i, use_threads=True)
+            writer.write_table(anonymize_table(table, anonymizer, columns, schema))
+    reader.close()
+
+
+def anonymize_feather(file_name, anonymized_file_name, anonymizer, columns):
+    """
+    Anonymize the specified columns of an Arrow IPC (Feather v2) file, one record batch at
+    a time.
+
+    The file is memory mapped, so that the columns that are not processed are written
+    without being copied in memory.
+
+    Parameters:
+        file_name (str): The Arrow IPC file.
+        anonymized_file_name (str): The output Arrow IPC file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices of the columns to anonymize.
+    """
+    pa = _import_pyarrow()
+    with pa.memory_map(file_name) as source:
+        reader = pa.ipc.open_file(source)
+        schema = anonymized_schema(reader.schema, columns)
+        with pa.ipc.new_file(anonymized_file_name, schema) as writer:
+            for i in range(reader.num_record_batches):
+                table = pa.Table.from_batches([reader.get_batch(i)])
+                writer.write_table(anonymize_table(table, anonymizer, columns, schema))
+
+
+def anonymize_csv_arrow(
+    file_name,
+    anonymized_file_name,
+    anonymizer,
+    columns,
+    block_size=None,
+    journal=None,
+    resume=False,
+):
+    """
+    Anonymize the specified columns of a CSV file with the multithreaded CSV reader and
+    writer of pyarrow.
+
+    The file is read by blocks of `block_size` bytes and each anonymized block is appended
+    to the output file. All the columns are read as text, so that the columns that are not
+    processed are written as they are. With a journal, the number of rows and bytes written
+    is recorded after each block, so that an interrupted run can be resumed.
+
+    Parameters:
+        file_name (str): The CSV file.
+        anonymized_file_name (str): The output CSV file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices of the columns to anonymize.
+        block_size (int, optional): Number of bytes read at once. Default is the pyarrow one.
+        journal (Journal, optional): The journal of the output file. Default is None.
+        resume (bool, optional): Whether to continue after the last checkpoint of the journal.
+            Default is False.
+    """
+    pa = _import_pyarrow()
+    import pyarrow.csv as pacsv
+
+    done = 0
+    mode = "wb"
+    state = journal.last() if resume and journal is not None else None
+    if state is not None:
+        # Drop what was written after the last checkpoint
+        done = state["rows"]
+        with open(anonymized_file_name, "r+b") as file:
+            file.truncate(state["bytes"])
+        mode = "ab"
+
+    with open(file_name, newline="") as file:
+        names = next(csv.reader(file), [])
+    read_options = pacsv.ReadOptions(use_threads=True)
+    if block_size is not None:
+        read_options.block_size = block_size
+    convert_options = pacsv.ConvertOptions(
+        column_types={name: pa.string() for name in names}
+    )
+    reader = pacsv.open_csv(
+        file_name, read_options=read_options, convert_options=convert_options
+    )
+    schema = anonymized_schema(reader.schema, columns)
+    write_options = pacsv.WriteOptions(include_header=state is None)
+    with pa.OSFile(anonymized_file_name, mode) as sink:
+        with pacsv.CSVWriter(sink, schema, write_options=write_options) as writer:
+            rows = 0
+            for batch in reader:
+                start = rows
+                rows += batch.num_rows
+                if rows <= done:
+                    # Skip the rows already written
+                    continue
+                table = pa.Table.from_batches([batch]).slice(max(0, done - start))
+                writer.write_table(anonymize_table(table, anonymizer, columns, schema))
+                if journal is not None:
+                    journal.checkpoint(
+                        rows=rows, bytes=os.path.getsize(anonymized_file_name)
+                    )
@@ -0,0 +1,182 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import csv
+import glob
+import os
+import time
+
+from anonymization.api.anonym_api import SUPPORTED_FORMATS
+from anonymization.api.anonym_api import Anonymizer
+from anonymization.api.anonym_api import anonymize_file
+from anonymization.api.anonym_api import anonymized_path
+from anonymization.api.anonym_api import print_stats
+from anonymization.api.journal import Journal
+
+
+def _supported(file_name):
+    root, extension = os.path.splitext(file_name)
+    return extension[1:].lower() in SUPPORTED_FORMATS and not root.endswith(
+        "_anonymized"
+    )
+
+
+def _glob_base(pattern):
+    """
+    Get the directory of a glob pattern before its first wildcard.
+    """
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+
+def read_manifest(manifest):
+    """
+    Read a manifest file: one input (file, directory or glob pattern) per line.
+
+    Empty lines and lines starting with "#" are ignored, and relative paths are relative to
+    the directory of the manifest.
+
+    Parameters:
+        manifest (str): The manifest file.
+
+    Returns:
+        list: The inputs.
+    """
+    base = os.path.dirname(manifest)
+    with open(manifest, "r") as file:
+        lines = [line.strip() for line in file]
+    return [
+        os.path.join(base, line) for line in lines if line and not line.startswith("#")
+    ]
+
+
+def expand_inputs(inputs):
+    """
+    Expand the inputs of the anonymize command into a list of files.
+
+    Directories are searched recursively for the supported files (except the already
+    anonymized ones) and glob patterns are expanded.
+
+    Parameters:
+        inputs (list): Files, directories or glob patterns.
+
+    Returns:
+        list: Pairs of the file and of its path relative to the input it comes from (the
+        directory, or the directory of the glob pattern before its first wildcard), without
+        duplicates and in the input order.
+    """
+    files = dict()
+    for item in inputs:
+        if os.path.isdir(item):
+            pattern = os.path.join(glob.escape(item), "**", "*")
+            matches = [
+                (f, os.path.relpath(f, item))
+                for f in glob.glob(pattern, recursive=True)
+            ]
+            matches = [(f, rel) for f, rel in sorted(matches) if _supported(f)]
+        elif glob.has_magic(item):
+            base = _glob_base(item)
+            matches = [
+                (f, os.path.relpath(f, base))
+                for f in sorted(glob.glob(item, recursive=True))
+                if os.path.isfile(f) and _supported(f)
+            ]
+        else:
+            matches = [(item, os.path.basename(item))]
+        for file_name, relative in matches:
+            files.setdefault(file_name, relative)
+    return list(files.items())
+
+
+def anonymize_files(inputs, config, output_dir=None, resume=False):
+    """
+    Anonymize several files with one anonymizer, so that the models are loaded only once.
+
+    A file that cannot be anonymized is reported and the next ones are processed. A file
+    whose output is the one of a previous file (e.g. "a/x.csv" and "b/x.csv" given by two
+    glob patterns with the same `output_dir`) is not anonymized and reported as a duplicate.
+
+    Parameters:
+        inputs (list): Files, directories or glob patterns, see `expand_inputs`.
+        config (dict): Anonymization configuration.
+        output_dir (str, optional): Directory of the anonymized files, where the structure
+            of the input directories is kept. Default is next to the input files.
+        resume (bool, optional): Whether to resume an interrupted run: the files whose output
+            is complete (without journal, see `anonymization.api.journal`) are skipped and the
+            partial CSV outputs are continued. Default is False.
+
+    Returns:
+        list: The report of each file, a dict with the "file", "output", "status" ("ok",
+        "skipped" or the error message) and "seconds" keys.
+    """
+    anonymizer = Anonymizer(config)
+    report = []
+    outputs = dict()
+    try:
+        for file_name, relative in expand_inputs(inputs):
+            output = anonymized_path(file_name)
+            if output_dir is not None:
+                output = anonymized_path(os.path.join(output_dir, relative))
+            start = time.perf_counter()
+            try:
+                key = os.path.normcase(os.path.abspath(output))
+                if key in outputs:
+                    status = f"Duplicate output: same output as {outputs[key]}"
+                elif resume and os.path.exists(output) and not Journal(output).exists():
+                    outputs[key] = file_name
+                    status = "skipped"
+                else:
+                    outputs[key] = file_name
+                    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+                    anonymize_file(file_name, anonymizer, output, resume=resume)
+                    status = "ok"
+            except Exception as e:
+                status = f"{type(e).__name__}: {e}"
+            report.append(
+                {
+                    "file": file_name,
+                    "output": output,
+                    "status": status,
+                    "seconds": time.perf_counter() - start,
+                }
+            )
+            print(f"{file_name} -> {output}: {status} ({report[-1]['seconds']:.2f}s)")
+        print_stats(anonymizer)
+    finally:
+        anonymizer.close()
+    return report
+
+
+def print_report(report, report_file=None):
+    """
+    Print the summary of a batch of files, and optionally save the report as a CSV file.
+
+    Parameters:
+        report (list): The report returned by `anonymize_files`.
+        report_file (str, optional): Path of the CSV report. Default is None (not saved).
+    """
+    failed = [item for item in report if item["status"] not in ["ok", "skipped"]]
+    total = sum(item["seconds"] for item in report)
+    print(
+        f"{len(report) - len(failed)} of {len(report)} files anonymized in {total:.2f}s"
+    )
+    for item in failed:
+        print(f"Failed: {item['file']} ({item['status']})")
+    if report_file is not None:
+        with open(report_file, "w", newline="") as file:
+            writer = csv.DictWriter(
+                file, fieldnames=["file", "output", "status", "seconds"]
+            )
+            writer.writeheader()
+            writer.writerows(report)
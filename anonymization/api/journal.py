@@ -0,0 +1,88 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import json
+import os
+
+
+class Journal(object):
+    """
+    Journal of the progress of the anonymization of a file, so that an interrupted run can be
+    resumed.
+
+    The journal is a JSON lines file written next to the anonymized file. It is created when
+    the anonymization of the file starts, a checkpoint is appended each time a part of the
+    output is written, and it is deleted when the file is done. So an output file without
+    journal is complete, and an output file with a journal is partial.
+
+    Args:
+        anonymized_file_name (str): The output file.
+
+    Example Usage:
+        journal = Journal("data_anonymized.csv")
+        journal.start()
+        journal.checkpoint(rows=10000, bytes=1250000)
+        print(journal.last())
+        journal.finish()
+    """
+
+    def __init__(self, anonymized_file_name) -> None:
+        self.path = f"{anonymized_file_name}.journal"
+
+    def exists(self):
+        """
+        Check whether the journal exists, i.e. whether the output file is partial.
+        """
+        return os.path.exists(self.path)
+
+    def start(self):
+        """
+        Create an empty journal.
+        """
+        with open(self.path, "w"):
+            pass
+
+    def checkpoint(self, **state):
+        """
+        Append a checkpoint to the journal and write it to the disk.
+
+        Parameters:
+            **state: The progress, e.g. the number of rows and bytes written.
+        """
+        with open(self.path, "a") as file:
+            file.write(json.dumps(state) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+    def last(self):
+        """
+        Get the last checkpoint of the journal.
+
+        Returns:
+            dict or None: The last complete checkpoint, or None if there is none.
+        """
+        if not self.exists():
+            return None
+        state = None
+        with open(self.path, "r") as file:
+            for line in file:
+                try:
+                    state = json.loads(line)
+                except json.JSONDecodeError:
+                    # Line cut by the interruption
+                    break
+        return state
+
+    def finish(self):
+        """
+        Delete the journal once the output file is complete.
+        """
+        if self.exists():
+            os.remove(self.path)
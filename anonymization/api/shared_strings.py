@@ -0,0 +1,248 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import html
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import column_index_from_string
+
+SHARED_STRINGS = "xl/sharedStrings.xml"
+WORKBOOK = "xl/workbook.xml"
+WORKSHEETS = "xl/worksheets/"
+
+# Rows and cells of a worksheet (the sheets are rewritten with regular expressions so that
+# the rest of the XML is kept byte for byte). The tags may have a namespace prefix
+# (e.g. "<x:c>") and the cell reference ("r" attribute) is optional.
+CELL = re.compile(
+    r"<(?P<row>(?:\w+:)?row)\b|<(?P<prefix>\w+:)?c\b(?P<attrs>[^>]*?)"
+    r"(?:/>|>(?P<content>.*?)</(?:\w+:)?c>)",
+    re.S,
+)
+SHARED_STRING = re.compile(r"<(?:\w+:)?si\b[^>]*?(?:/>|>.*?</(?:\w+:)?si>)", re.S)
+SST = re.compile(r"<(\w+:)?sst\b")
+TEXT = re.compile(r"<(?:\w+:)?t\b[^>]*?(?:/>|>(.*?)</(?:\w+:)?t>)", re.S)
+PHONETIC = re.compile(r"<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>", re.S)
+FORMULA = re.compile(r"<(?:\w+:)?f\b")
+VALUE = re.compile(r"(<(?:\w+:)?v>)(.*?)(</(?:\w+:)?v>)", re.S)
+REF = re.compile(r'\sr="([A-Z]+)\d+"')
+TYPE = re.compile(r'\st="(\w+)"')
+UNIQUE_COUNT = re.compile(r'\buniqueCount="\d+"')
+# Calculation properties of the workbook, or the elements it follows
+CALC_PR = re.compile(r"<(?:\w+:)?calcPr\b(?P<attrs>[^>]*?)(?P<end>/?>)")
+CALC_PR_AFTER = re.compile(
+    r"</(?P<prefix>\w+:)?(?:sheets|functionGroups|externalReferences|definedNames)>"
+)
+FULL_CALC = re.compile(r'\sfullCalcOnLoad="\w+"')
+
+
+def _text(fragment):
+    """
+    Get the text of a shared string or inline string (concatenating the rich text runs).
+    """
+    fragment = PHONETIC.sub("", fragment)
+    return "".join(html.unescape(t or "") for t in TEXT.findall(fragment))
+
+
+def _inline(prefix, attrs, text):
+    """
+    Build a cell holding an inline string.
+    """
+    attrs = TYPE.sub("", attrs)
+    return (
+        f'<{prefix}c{attrs} t="inlineStr"><{prefix}is>'
+        f'<{prefix}t xml:space="preserve">{escape(text)}</{prefix}t></{prefix}is></{prefix}c>'
+    )
+
+
+def _recalculate(workbook):
+    """
+    Ask Excel to recalculate the formulas when the workbook is opened.
+    """
+    calc = CALC_PR.search(workbook)
+    if calc is not None:
+        attrs = FULL_CALC.sub("", calc.group("attrs"))
+        start, end = calc.span("attrs")
+        return f'{workbook[:start]}{attrs} fullCalcOnLoad="1"{workbook[end:]}'
+    anchors = list(CALC_PR_AFTER.finditer(workbook))
+    if not anchors:
+        return workbook
+    prefix, end = anchors[-1].group("prefix") or "", anchors[-1].end()
+    return f'{workbook[:end]}<{prefix}calcPr fullCalcOnLoad="1"/>{workbook[end:]}'
+
+
+def _cells(sheet, columns):
+    """
+    Iterate over the cells of a worksheet.
+
+    The column of a cell is given by its reference, or is the one following the previous
+    cell of the row when the reference is missing.
+
+    Yields:
+        tuple: The match of the cell, its type, its content and whether it is in a
+        processed column.
+    """
+    column = 0
+    for match in CELL.finditer(sheet):
+        if match.group("row") is not None:
+            column = 0
+            continue
+        attrs, content = match.group("attrs"), match.group("content") or ""
+        ref = REF.search(attrs)
+        column = column_index_from_string(ref.group(1)) if ref else column + 1
+        cell_type = TYPE.search(attrs)
+        yield match, (
+            cell_type.group(1) if cell_type else "n"
+        ), content, column in columns
+
+
+def _direct(cell_type, content):
+    """
+    Get the text of a cell that does not reference a shared string, or None if the cell
+    is not anonymized (formulas, booleans, errors, empty cells).
+    """
+    if FORMULA.search(content):
+        return None
+    if cell_type == "inlineStr":
+        return _text(content)
+    value = VALUE.search(content)
+    if cell_type in ["n", "str"] and value is not None:
+        return html.unescape(value.group(2))
+    return None
+
+
+def anonymize_xlsx_shared_strings(file_name, anonymized_file_name, anonymizer, columns):
+    """
+    Anonymize the specified columns of all the sheets of an Excel file through its shared
+    strings table.
+
+    Excel stores each distinct text once in `xl/sharedStrings.xml` and the cells only
+    reference it, so each distinct text of the processed columns is anonymized once. A
+    shared string also referenced from other columns is kept and the processed cells point
+    to a new, anonymized, entry. The formulas of the processed cells are kept, but their
+    cached result is removed and the workbook is marked to be recalculated when it is
+    opened. The rest of the file is copied unchanged.
+
+    Parameters:
+        file_name (str): The Excel file.
+        anonymized_file_name (str): The output Excel file.
+        anonymizer (Anonymizer): The anonymizer.
+        columns (list): Indices (starting at 1) of the columns to anonymize.
+    """
+    with zipfile.ZipFile(file_name) as archive:
+        items = [(info, archive.read(info)) for info in archive.infolist()]
+    sheets = [
+        info.filename
+        for info, _ in items
+        if info.filename.startswith(WORKSHEETS)
+        and info.filename.endswith(".xml")
+        and "/_rels/" not in info.filename
+    ]
+    files = {
+        info.filename: data.decode("utf-8")
+        for info, data in items
+        if info.filename in sheets or info.filename in [SHARED_STRINGS, WORKBOOK]
+    }
+
+    table = files.get(SHARED_STRINGS, "")
+    matches = list(SHARED_STRING.finditer(table))
+    strings = [m.group(0) for m in matches]
+
+    # Find the shared strings referenced from the processed (and other) columns,
+    # and the texts of the processed cells not using the shared strings
+    processed = set()
+    others = set()
+    direct = dict()
+    for name in sheets:
+        for _, cell_type, content, in_columns in _cells(files[name], columns):
+            value = VALUE.search(content)
+            if cell_type == "s" and value is not None:
+                (processed if in_columns else others).add(int(value.group(2)))
+            elif in_columns:
+                text = _direct(cell_type, content)
+                if text is not None:
+                    direct[text] = None
+
+    # Anonymize each distinct text once
+    indices = sorted(i for i in processed if i < len(strings))
+    texts = [_text(strings[i]) for i in indices]
+    n_texts = len(texts)
+    values = anonymizer.anonymize_batch(texts + list(direct))
+    direct = dict(zip(direct, values[n_texts:]))
+
+    # Rewrite the shared strings table
+    sst = SST.search(table)
+    prefix = (sst.group(1) or "") if sst else ""
+    mapping = dict()
+    for i, text, value in zip(indices, texts, values):
+        if value == text:
+            continue
+        entry = (
+            f'<{prefix}si><{prefix}t xml:space="preserve">{escape(value)}</{prefix}t>'
+            f"</{prefix}si>"
+        )
+        if i in others:
+            mapping[i] = len(strings)
+            strings.append(entry)
+        else:
+            strings[i] = entry
+
+    # Rewrite the processed cells of the worksheets
+    formulas = []
+
+    def rewrite(sheet):
+        out = []
+        pos = 0
+        for match, cell_type, content, in_columns in _cells(sheet, columns):
+            if not in_columns:
+                continue
+            value = VALUE.search(content)
+            if cell_type == "s" and value is not None:
+                index = int(value.group(2))
+                if index not in mapping:
+                    continue
+                cell = match.group(0).replace(
+                    value.group(0), f"{value.group(1)}{mapping[index]}{value.group(3)}"
+                )
+            elif FORMULA.search(content):
+                if value is None:
+                    continue
+                # The cached result may hold the text built by the formula
+                cell = match.group(0).replace(value.group(0), "")
+                formulas.append(cell)
+            else:
+                text = _direct(cell_type, content)
+                if text is None or direct[text] == text:
+                    continue
+                cell = _inline(
+                    match.group("prefix") or "", match.group("attrs"), direct[text]
+                )
+            start = match.start()
+            out.append(sheet[pos:start])
+            out.append(cell)
+            pos = match.end()
+        out.append(sheet[pos:])
+        return "".join(out)
+
+    for name in sheets:
+        files[name] = rewrite(files[name])
+    if formulas and WORKBOOK in files:
+        files[WORKBOOK] = _recalculate(files[WORKBOOK])
+    if matches:
+        start, end = matches[0].start(), matches[-1].end()
+        header = UNIQUE_COUNT.sub(f'uniqueCount="{len(strings)}"', table[:start])
+        files[SHARED_STRINGS] = header + "".join(strings) + table[end:]
+
+    with zipfile.ZipFile(anonymized_file_name, "w") as archive:
+        for info, data in items:
+            if info.filename in files:
+                data = files[info.filename].encode("utf-8")
+            archive.writestr(info, data)
@@ -0,0 +1,176 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import json
+import sys
+import threading
+import time
+from queue import Empty
+from queue import Queue
+
+STREAM_FORMATS = ["jsonl", "lines"]
+
+# End of the input stream
+_END = object()
+
+# Invalid JSON line
+_INVALID = object()
+
+
+def _read(lines, queue):
+    """
+    Push the input lines to the queue (in a background thread), then the reading error if
+    any, and the end of the stream.
+    """
+    try:
+        for line in lines:
+            queue.put(line)
+    except Exception as e:
+        queue.put(e)
+    finally:
+        queue.put(_END)
+
+
+def _get(queue, timeout=None):
+    """
+    Get the next line from the queue, raising the reading errors.
+    """
+    item = queue.get(timeout=timeout)
+    if isinstance(item, Exception):
+        raise item
+    return item
+
+
+def micro_batches(lines, batch_size=64, max_delay=0.2, max_buffer=None):
+    """
+    Group the lines of a stream into micro-batches.
+
+    A batch is emitted when it holds `batch_size` lines, or `max_delay` seconds after its
+    first line, so that a slow stream is not delayed. The lines are read in a background
+    thread through a bounded queue, so that at most `max_buffer` lines are waiting.
+
+    Parameters:
+        lines (iterable): The input lines, e.g. `sys.stdin`.
+        batch_size (int, optional): Maximum number of lines per batch. Default is 64.
+        max_delay (float, optional): Maximum waiting time of a line, in seconds.
+            Default is 0.2.
+        max_buffer (int, optional): Maximum number of lines read in advance.
+            Default is 4 batches.
+
+    Yields:
+        list: The batches of lines, in the input order.
+    """
+    queue = Queue(maxsize=4 * batch_size if max_buffer is None else max_buffer)
+    threading.Thread(target=_read, args=(lines, queue), daemon=True).start()
+    while True:
+        item = _get(queue)
+        if item is _END:
+            return
+        batch = [item]
+        deadline = time.monotonic() + max_delay
+        while len(batch) < batch_size:
+            try:
+                item = _get(queue, timeout=max(0, deadline - time.monotonic()))
+            except Empty:
+                break
+            if item is _END:
+                yield batch
+                return
+            batch.append(item)
+        yield batch
+
+
+def _parse(line):
+    """
+    Parse a JSON line, or return `_INVALID` (with a warning on stderr) if it is invalid.
+    """
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        # The line is not written, since its text could not be anonymized
+        print(f"Skipping invalid JSON line: {e}", file=sys.stderr)
+        return _INVALID
+
+
+def anonymize_lines(lines, anonymizer, stream_format="jsonl", fields=None):
+    """
+    Anonymize a batch of lines.
+
+    Parameters:
+        lines (list): The lines (with or without the line break).
+        anonymizer (Anonymizer): The anonymizer.
+        stream_format (str, optional): "jsonl" (one JSON object per line, whose text fields
+            are anonymized) or "lines" (plain text lines). Default is "jsonl".
+        fields (list, optional): The fields of the JSON objects to anonymize.
+            Default is all the fields whose value is a string.
+
+    Returns:
+        list: The anonymized lines, without line break. The invalid JSON lines are dropped,
+        with a warning on stderr.
+    """
+    lines = [line.rstrip("\r\n") for line in lines]
+    if stream_format == "lines":
+        return anonymizer.anonymize_batch(lines)
+
+    records = [_parse(line) for line in lines]
+    refs = [
+        (record, key)
+        for record in records
+        if isinstance(record, dict)
+        for key in (record if fields is None else fields)
+        if isinstance(record.get(key), str)
+    ]
+    values = anonymizer.anonymize_batch([record[key] for record, key in refs])
+    for (record, key), value in zip(refs, values):
+        record[key] = value
+    return [
+        line if record is None else json.dumps(record, ensure_ascii=False)
+        for line, record in zip(lines, records)
+        if record is not _INVALID
+    ]
+
+
+def anonymize_stream(
+    anonymizer,
+    input=None,
+    output=None,
+    stream_format="jsonl",
+    fields=None,
+    batch_size=64,
+    max_delay=0.2,
+):
+    """
+    Anonymize a stream of lines, e.g. from the standard input to the standard output.
+
+    The lines are anonymized in micro-batches (see `micro_batches`) and each batch is
+    written, in the input order, as soon as it is done.
+
+    Parameters:
+        anonymizer (Anonymizer): The anonymizer.
+        input (iterable, optional): The input lines. Default is `sys.stdin`.
+        output (file, optional): The output stream. Default is `sys.stdout`.
+        stream_format (str, optional): "jsonl" or "lines", see `anonymize_lines`.
+            Default is "jsonl".
+        fields (list, optional): The fields of the JSON objects to anonymize.
+            Default is all the fields whose value is a string.
+        batch_size (int, optional): Maximum number of lines per batch. Default is 64.
+        max_delay (float, optional): Maximum waiting time of a line before its batch is
+            anonymized, in seconds. Default is 0.2.
+    """
+    if stream_format not in STREAM_FORMATS:
+        raise ValueError(f"Unsupported stream format: {stream_format}")
+    input = sys.stdin if input is None else input
+    output = sys.stdout if output is None else output
+    for batch in micro_batches(input, batch_size, max_delay):
+        for line in anonymize_lines(batch, anonymizer, stream_format, fields):
+            output.write(line + "\n")
+        output.flush()
@@ -0,0 +1,142 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import mmap
+import os
+import re
+
+# Blank lines between two paragraphs
+PARAGRAPH_BREAK = re.compile(rb"\n[ \t\r\f\v]*\n\s*")
+WHITESPACE = b" \t\r\n\f\v"
+
+
+def _split(data, start, end, max_size):
+    """
+    Split a long paragraph on line breaks into pieces of at most `max_size` bytes (a longer
+    line is kept whole).
+
+    Yields:
+        tuple: The start and end of each piece.
+    """
+    while end - start > max_size:
+        cut = data.rfind(b"\n", start, start + max_size)
+        if cut <= start:
+            cut = data.find(b"\n", start + max_size, end)
+            if cut == -1:
+                break
+        yield start, cut
+        start = cut + 1
+    yield start, end
+
+
+def _segments(data, start, end, next_start, max_size):
+    """
+    Decode the pieces of a paragraph with the separators following them.
+    """
+    pieces = list(_split(data, start, end, max_size))
+    separators = [piece_start for piece_start, _ in pieces[1:]] + [next_start]
+    for (piece_start, piece_end), separator_end in zip(pieces, separators):
+        yield (
+            data[piece_start:piece_end].decode("utf-8"),
+            data[piece_end:separator_end].decode("utf-8"),
+            separator_end,
+        )
+
+
+def iter_segments(file_name, max_size=100000, offset=0):
+    """
+    Iterate lazily over the paragraphs of a memory mapped text file.
+
+    Paragraphs are separated by blank lines, and the ones longer than `max_size` bytes (e.g.
+    logs without blank lines) are split on line breaks.
+
+    Parameters:
+        file_name (str): The UTF-8 text file.
+        max_size (int, optional): Maximum size of a segment in bytes. Default is 100000.
+        offset (int, optional): Position in the file (in bytes) of the first segment.
+            Default is 0.
+
+    Yields:
+        tuple: The text of the segment, the separator following it (line breaks and
+        whitespace) and the position in the file after the separator.
+    """
+    if os.path.getsize(file_name) == 0:
+        return
+    with open(file_name, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = offset
+            for match in PARAGRAPH_BREAK.finditer(data, offset):
+                yield from _segments(data, start, match.start(), match.end(), max_size)
+                start = match.end()
+            # The trailing whitespace is the separator of the last paragraph
+            end = len(data)
+            while end > start and data[end - 1] in WHITESPACE:
+                end -= 1
+            if start < len(data):
+                yield from _segments(data, start, end, len(data), max_size)
+
+
+def anonymize_text_stream(
+    file_name,
+    anonymized_file_name,
+    anonymizer,
+    batch_size=64,
+    max_size=100000,
+    journal=None,
+    resume=False,
+):
+    """
+    Anonymize a large text file paragraph by paragraph.
+
+    The file is memory mapped and its paragraphs (see `iter_segments`) are anonymized in
+    batches and written to the output file as soon as they are done, so that the memory
+    usage does not depend on the file size. Each paragraph is formatted with `improve_text`
+    and the line breaks between paragraphs are kept. With a journal, the position in the
+    input and output files is recorded after each batch, so that an interrupted run can be
+    resumed.
+
+    Parameters:
+        file_name (str): The UTF-8 text file.
+        anonymized_file_name (str): The output text file.
+        anonymizer (Anonymizer): The anonymizer.
+        batch_size (int, optional): Number of paragraphs anonymized at once. Default is 64.
+        max_size (int, optional): Maximum size of a paragraph in bytes. Default is 100000.
+        journal (Journal, optional): The journal of the output file. Default is None.
+        resume (bool, optional): Whether to continue after the last checkpoint of the journal.
+            Default is False.
+    """
+    offset = 0
+    mode = "wb"
+    state = journal.last() if resume and journal is not None else None
+    if state is not None:
+        # Drop what was written after the last checkpoint
+        offset = state["offset"]
+        with open(anonymized_file_name, "r+b") as output:
+            output.truncate(state["bytes"])
+        mode = "ab"
+
+    with open(anonymized_file_name, mode) as output:
+
+        def write(batch):
+            values = anonymizer.anonymize_batch([text for text, _, _ in batch])
+            for value, (_, separator, _) in zip(values, batch):
+                output.write((value + separator).encode("utf-8"))
+            output.flush()
+            if journal is not None:
+                journal.checkpoint(offset=batch[-1][2], bytes=output.tell())
+
+        batch = []
+        for segment in iter_segments(file_name, max_size, offset):
+            batch.append(segment)
+            if len(batch) == batch_size:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
@@ -8,7 +8,20 @@
 # anonymization: Text ner and pii
 #
 
-from .custom_recognizer import BankAcount  # noqa: F401
-from .custom_recognizer import SwissZipCode  # noqa: F401
-from .pii import Anonymize  # noqa: F401
-from .pii import PIIDetection  # noqa: F401
+import importlib
+
+# Imported on first access, so that light modules such as `anonymization.pii.config`
+# do not load the NLP libraries.
+_LAZY_IMPORTS = {
+    "BankAcount": "custom_recognizer",
+    "SwissZipCode": "custom_recognizer",
+    "Anonymize": "pii",
+    "PIIDetection": "pii",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_IMPORTS:
+        module = importlib.import_module(f".{_LAZY_IMPORTS[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
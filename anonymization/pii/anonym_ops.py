@@ -8,6 +8,7 @@
 # anonymization: Text ner and pii
 #
 
+from functools import partial
 
 from presidio_anonymizer.entities import OperatorConfig
 
@@ -23,6 +24,9 @@ from anonymization.pii.fake_gen import fake_swiss_french_organization
 from anonymization.pii.fake_gen import fake_swiss_location
 from anonymization.pii.fake_gen import fake_swiss_zip_code
 from anonymization.pii.fake_gen import fake_url
+from anonymization.pii.fake_gen import seed_fakers
+from anonymization.pii.fake_gen import set_pseudonym_pool
+from anonymization.pii.pseudonym_store import make_pseudonym_store
 
 OPS = {
     "DEFAULT": OperatorConfig("replace", {"new_value": " <ANONYMIZED>"}),
@@ -79,11 +83,28 @@ OPS_FLAG = {
 }
 
 
-def gen_operators(config):
+def bind(operator, **params):
+    """Bind parameters to the function of a custom operator.
+
+    Args:
+        operator (OperatorConfig): Custom operator
+        **params: Keyword arguments of the function
+
+    Returns:
+        OperatorConfig: Custom operator calling the function with the parameters
+    """
+    return OperatorConfig(
+        "custom", {"lambda": partial(operator.params["lambda"], **params)}
+    )
+
+
+def gen_operators(config, store=None):
     """Generate anonymization operators based on configuration.
 
     Args:
         config (dict): Configuration
+        store (PseudonymStore, optional): Store of the pseudonyms, shared by the operators.
+            Default is a new store, see `make_pseudonym_store`
 
     Returns:
         dict: OperatorConfig
@@ -94,9 +115,17 @@ def gen_operators(config):
     if config.get("flag_only", False):
         return OPS_FLAG
 
+    if config.get("faker_seed") is not None:
+        seed_fakers(config["faker_seed"])
+    set_pseudonym_pool(config.get("pseudonym_pool_size", 0))
+    if store is None:
+        store = make_pseudonym_store(config)
+
+    # The key and store are given to the operators, so that each anonymizer keeps its own
+    key = config.get("pseudonym_key")
     for item in config.get("pseudonymize", []):
         if item in OPS_FAKE:
-            out[item] = OPS_FAKE[item]
+            out[item] = bind(OPS_FAKE[item], key=key, store=store)
     for item, value in OPS.items():
         if item not in out:
             out[item] = value
@@ -0,0 +1,205 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from presidio_analyzer import RecognizerResult
+
+# Configuration keys that change the analysis results
+DETECTION_KEYS = [
+    "language",
+    "entities",
+    "use_camembert",
+    "use_swiss_ner",
+    "use_spacy",
+    "use_scapy",
+    "chunk_size",
+    "chunk_overlap",
+    "merge_policy",
+    "entity_priority",
+    "ner_backend",
+]
+
+
+def config_fingerprint(config):
+    """
+    Compute the fingerprint of the detection part of a configuration.
+
+    Parameters:
+        config (dict): Anonymization configuration.
+
+    Returns:
+        str: A hash of the configuration keys that change the analysis results.
+    """
+    detection = {key: config.get(key) for key in DETECTION_KEYS}
+    data = json.dumps(detection, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _dump(results):
+    return [
+        (
+            r.entity_type,
+            r.start,
+            r.end,
+            r.score,
+            r.analysis_explanation if isinstance(r.analysis_explanation, str) else None,
+            r.recognition_metadata,
+        )
+        for r in results
+    ]
+
+
+def _load(data):
+    return [
+        RecognizerResult(
+            entity_type=entity_type,
+            start=start,
+            end=end,
+            score=score,
+            analysis_explanation=explanation,
+            recognition_metadata=metadata,
+        )
+        for entity_type, start, end, score, explanation, metadata in data
+    ]
+
+
+class AnalysisCache(object):
+    """
+    Content-addressed cache of analysis results.
+
+    The results are stored under a hash of the text and of the detection configuration,
+    in a bounded in-memory LRU and optionally in a SQLite database that can be reused
+    across runs and files.
+
+    Args:
+        fingerprint (str): Fingerprint of the detection configuration, see `config_fingerprint`.
+        max_size (int, optional): Maximum number of texts kept in memory. Default is 10000.
+        path (str, optional): Path of the SQLite database. Default is None (memory only).
+
+    Example Usage:
+        cache = AnalysisCache(config_fingerprint(config), path="analysis_cache.db")
+        results = cache.get(text)
+        if results is None:
+            results = detector.analyse(text)
+            cache.put(text, results)
+        print(cache.stats())
+    """
+
+    def __init__(self, fingerprint, max_size=10000, path=None) -> None:
+        self.fingerprint = fingerprint
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis (key TEXT PRIMARY KEY, results TEXT)"
+            )
+            self._db.commit()
+
+    def key(self, text):
+        """
+        Get the cache key of a text.
+        """
+        data = f"{self.fingerprint}\n{text}".encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def get(self, text):
+        """
+        Get the cached analysis results of a text.
+
+        Parameters:
+            text (str): The analysed text.
+
+        Returns:
+            list or None: The RecognizerResult objects, or None if the text is not in the cache.
+        """
+        key = self.key(text)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute(
+                    "SELECT results FROM analysis WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    data = json.loads(row[0])
+                    self._remember(key, data)
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return _load(data)
+
+    def put(self, text, results):
+        """
+        Store the analysis results of a text.
+
+        Parameters:
+            text (str): The analysed text.
+            results (list): The RecognizerResult objects of the text.
+        """
+        self.put_many([text], [results])
+
+    def put_many(self, texts, results):
+        """
+        Store the analysis results of several texts at once.
+
+        Parameters:
+            texts (list): The analysed texts.
+            results (list): One list of RecognizerResult objects per text.
+        """
+        rows = []
+        with self._lock:
+            for text, res in zip(texts, results):
+                key = self.key(text)
+                data = _dump(res)
+                self._remember(key, data)
+                rows.append((key, json.dumps(data, default=str)))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO analysis (key, results) VALUES (?, ?)", rows
+                )
+                self._db.commit()
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: The number of "hits" and "misses", and the number of texts in memory ("size").
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._memory)}
+
+    def close(self):
+        """
+        Close the SQLite database.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,169 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import re
+
+SENTENCE_END = re.compile(r"(?<=[.!?;])\s+|\n+")
+WORD = re.compile(r"\s*\S+\s*")
+
+
+def count_words(text):
+    """
+    Count the whitespace separated words of a text.
+
+    Parameters:
+        text (str): The input text.
+
+    Returns:
+        int: The number of words.
+    """
+    return len(text.split())
+
+
+def split_sentences(text):
+    """
+    Split a text into sentence spans.
+
+    The text is cut after sentence punctuation followed by whitespace and after line breaks.
+    The spans are contiguous and cover the whole text.
+
+    Parameters:
+        text (str): The input text.
+
+    Returns:
+        list: A list of (start, end) tuples.
+    """
+    spans = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        end = match.end()
+        if end > start:
+            spans.append((start, end))
+            start = end
+    if start < len(text):
+        spans.append((start, len(text)))
+    return spans
+
+
+def split_words(text, start, end):
+    """
+    Split a span of a text into word spans.
+
+    Parameters:
+        text (str): The input text.
+        start (int): Start index of the span.
+        end (int): End index of the span.
+
+    Returns:
+        list: A list of (start, end) tuples covering the span.
+    """
+    spans = [
+        (start + m.start(), start + m.end()) for m in WORD.finditer(text[start:end])
+    ]
+    return spans if spans else [(start, end)]
+
+
+def chunk_text(text, chunk_size=400, overlap=50, count_tokens=None):
+    """
+    Split a text into overlapping chunks of bounded size.
+
+    Sentences are packed greedily into chunks of at most `chunk_size` tokens. Sentences that are
+    longer than `chunk_size` are split on word boundaries. Consecutive chunks share up to `overlap`
+    tokens so that entities at the boundaries are seen in full by at least one chunk.
+
+    Parameters:
+        text (str): The input text.
+        chunk_size (int, optional): Maximum number of tokens per chunk. Default is 400.
+        overlap (int, optional): Maximum number of tokens shared by two consecutive chunks. Default is 50.
+        count_tokens (callable, optional): Function returning the number of tokens of a string.
+            Default is `count_words`.
+
+    Returns:
+        list: A list of (start, end) tuples, one per chunk.
+    """
+    count_tokens = count_words if count_tokens is None else count_tokens
+    units = []
+    for start, end in split_sentences(text):
+        size = count_tokens(text[start:end])
+        if size > chunk_size:
+            for w_start, w_end in split_words(text, start, end):
+                units.append((w_start, w_end, count_tokens(text[w_start:w_end])))
+        else:
+            units.append((start, end, size))
+    if not units:
+        return [(0, len(text))]
+
+    chunks = []
+    i = 0
+    while i < len(units):
+        j = i
+        size = 0
+        while j < len(units) and (j == i or size + units[j][2] <= chunk_size):
+            size += units[j][2]
+            j += 1
+        chunks.append((units[i][0], units[j - 1][1]))
+        if j == len(units):
+            break
+
+        # Step back over the last units to build the overlap
+        k = j
+        size = 0
+        while k - 1 > i and size + units[k - 1][2] <= overlap:
+            k -= 1
+            size += units[k][2]
+        i = k
+    return chunks
+
+
+def _source(result):
+    """
+    Get the name of the detector that produced a result.
+    """
+    if isinstance(result.analysis_explanation, str):
+        return result.analysis_explanation
+    if result.recognition_metadata:
+        return result.recognition_metadata.get("recognizer_name")
+    return None
+
+
+def merge_chunk_results(chunks, results, text_length):
+    """
+    Map the results of the chunks of a text back to the text.
+
+    The offsets of the results are shifted by the start of their chunk. Results that are cut
+    by a chunk boundary are dropped when the neighbouring chunk sees them in full, and duplicates
+    found in the overlap regions are removed (the highest score is kept).
+
+    Parameters:
+        chunks (list): The (start, end) tuples of the chunks, as returned by `chunk_text`.
+        results (list): One list of RecognizerResult objects per chunk.
+        text_length (int): Length of the original text.
+
+    Returns:
+        list: The RecognizerResult objects of the whole text.
+    """
+    if len(chunks) == 1:
+        return list(results[0])
+
+    kept = dict()
+    for c, ((start, end), items) in enumerate(zip(chunks, results)):
+        for item in items:
+            item.start += start
+            item.end += start
+            if item.end == end and end < text_length and c + 1 < len(chunks):
+                if chunks[c + 1][0] <= item.start:
+                    continue
+            if item.start == start and start > 0 and c > 0:
+                if chunks[c - 1][1] >= item.end:
+                    continue
+            key = (item.entity_type, item.start, item.end, _source(item))
+            if key not in kept or kept[key].score < item.score:
+                kept[key] = item
+    return list(kept.values())
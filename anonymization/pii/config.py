@@ -39,6 +39,27 @@ def gen_default_config():
             # "LOCATION",
         ],
         "flag_only": True,
+        "faker_seed": None,
+        "pseudonym_key": None,
+        "pseudonym_pool_size": 0,
+        "pseudonym_store_size": 100000,
+        "pseudonym_store_path": None,
         "process_columns": [5],
+        "csv_chunksize": 10000,
+        "csv_engine": "pandas",
+        "xlsx_mode": "full",
+        "txt_mode": "full",
+        "stream_batch_size": 64,
+        "batch_size": 8,
+        "chunk_size": 400,
+        "chunk_overlap": 50,
+        "concurrent": False,
+        "workers": 1,
+        "ner_backend": "pytorch",
+        "merge_policy": "union",
+        "cache_size": 10000,
+        "cache_path": None,
+        "prescreen": True,
+        "prescreen_min_length": 2,
     }
     return out
@@ -8,13 +8,18 @@
 # anonymization: Text ner and pii
 #
 
-import random
+import hashlib
+import hmac
 import string
+import threading
 from datetime import date
+from functools import lru_cache
 
 import gender_guesser.detector as gender
 from faker import Faker
 
+from anonymization.pii.pseudonym_pool import PseudonymPool
+from anonymization.pii.pseudonym_store import PseudonymStore
 from anonymization.utils import clean_string
 from anonymization.utils import get_title
 
@@ -140,35 +145,195 @@ keywords_to_types = {
     "company": ["société", "entreprise"],
 }
 
-MEM_FAKE = dict()
+# Pseudonyms generated so far by the functions called without store
+_STORE = PseudonymStore()
+
+DEFAULT_LOCALE = "fr_CH"
+
+# Faker generators, created once per thread and locale
+_FAKERS = threading.local()
+_FAKERS_LOCK = threading.Lock()
+_FAKER_SEED = None
+_FAKER_COUNTS = dict()
+
+# Pools of fake values per locale, see `set_pseudonym_pool`
+_POOLS = dict()
+_POOL_SIZE = 0
+
+# Gender detector, whose name dictionary is parsed on first use
+_GENDER_DETECTOR = None
+_GENDER_LOCK = threading.Lock()
+GENDER_CACHE_SIZE = 10000
+
+
+def seed_fakers(seed):
+    """
+    Seed the Faker generators, for reproducible pseudonyms.
+
+    The generators and pools created before are dropped. The generator of a locale is
+    seeded with the seed, the locale and its creation order, so a single-threaded run always
+    generates the same pseudonyms.
+
+    Parameters:
+        seed (int or None): The seed, None for random pseudonyms.
+    """
+    global _FAKER_SEED, _FAKERS
+    with _FAKERS_LOCK:
+        _FAKER_SEED = seed
+        _FAKER_COUNTS.clear()
+        _FAKERS = threading.local()
+    set_pseudonym_pool(_POOL_SIZE)
+
+
+def get_faker(locale=DEFAULT_LOCALE):
+    """
+    Get the Faker generator of a locale.
+
+    Loading the locale providers is slow, so each thread creates the generator of a locale
+    once and reuses it. The generators are not shared between threads.
+
+    Parameters:
+        locale (str, optional): The Faker locale. Default is "fr_CH".
+
+    Returns:
+        Faker: The generator.
+    """
+    fakers = _FAKERS.__dict__.setdefault("fakers", dict())
+    fake = fakers.get(locale)
+    if fake is None:
+        fake = Faker(locale)
+        with _FAKERS_LOCK:
+            count = _FAKER_COUNTS.get(locale, 0)
+            _FAKER_COUNTS[locale] = count + 1
+            seed = _FAKER_SEED
+        if seed is not None:
+            fake.seed_instance(f"{seed}:{locale}:{count}")
+        fakers[locale] = fake
+    return fake
+
+
+def keyed_faker(original, entity, locale=DEFAULT_LOCALE, key=None):
+    """
+    Get the Faker generator used to pseudonymize an original text.
+
+    Without pseudonym key, this is the generator of the locale (see `get_faker`). With a
+    key, a generator of the thread (separate from the one of `get_faker`) is seeded with an
+    HMAC-SHA256 of the key, of the cleaned original text and of the entity type. A text then
+    gets the same pseudonym in every thread, process and run using the same key, and the
+    pseudonyms cannot be traced back to the original texts without the key.
+
+    Parameters:
+        original (str): The original text.
+        entity (str): The entity type.
+        locale (str, optional): The Faker locale. Default is "fr_CH".
+        key (str, optional): The secret key of the pseudonyms. Default is None.
+
+    Returns:
+        Faker: The generator.
+    """
+    if key is None:
+        return get_faker(locale)
+    fakers = _FAKERS.__dict__.setdefault("keyed", dict())
+    fake = fakers.get(locale)
+    if fake is None:
+        fake = fakers[locale] = Faker(locale)
+    message = f"{clean_string(original)}\n{entity}".encode("utf-8")
+    digest = hmac.new(key.encode("utf-8"), message, hashlib.sha256).digest()
+    fake.seed_instance(int.from_bytes(digest, "big"))
+    return fake
+
+
+def set_pseudonym_pool(size):
+    """
+    Set the size of the pools of fake values, see `PseudonymPool`.
+
+    The pools created before are dropped. Without seed (see `seed_fakers`), the pools are
+    refilled in a background thread.
+
+    Parameters:
+        size (int): Number of fake values generated at once per provider method, 0 to
+            generate each value when it is needed.
+    """
+    global _POOLS, _POOL_SIZE
+    with _FAKERS_LOCK:
+        pools, _POOLS = _POOLS, dict()
+        _POOL_SIZE = size
+    for pool in pools.values():
+        pool.close()
+
+
+def fake_value(original, entity, method, locale=DEFAULT_LOCALE, key=None):
+    """
+    Generate a fake value for an original text with a Faker provider method.
+
+    The value is drawn from the pool of the method if the pools are enabled (see
+    `set_pseudonym_pool`), or generated with `keyed_faker`. Keyed pseudonyms are never
+    drawn from the pools, so that they stay deterministic.
+
+    Parameters:
+        original (str): The original text.
+        entity (str): The entity type.
+        method (str): The Faker provider method, without argument (e.g. "name_male").
+        locale (str, optional): The Faker locale. Default is "fr_CH".
+        key (str, optional): The secret key of the pseudonyms. Default is None.
+
+    Returns:
+        The fake value.
+    """
+    if _POOL_SIZE <= 0 or key is not None:
+        return getattr(keyed_faker(original, entity, locale, key), method)()
+    pool = _POOLS.get(locale)
+    if pool is None:
+        with _FAKERS_LOCK:
+            pool = _POOLS.get(locale)
+            if pool is None:
+                pool = _POOLS[locale] = PseudonymPool(
+                    locale, _POOL_SIZE, background=_FAKER_SEED is None
+                )
+    return pool.draw(method, get_faker(locale))
+
+
+def get_pseudonym_store():
+    """
+    Get the store of the pseudonyms generated by the functions called without store.
+
+    Returns:
+        PseudonymStore: The store.
+    """
+    return _STORE
 
 
 def reset_mem_fake():
     """
-    Reset the global MEM_FAKE dictionary.
+    Reset the pseudonym store of the functions called without store.
 
-    This function clears the global MEM_FAKE dictionary, which is used to store fake names for entities.
+    This function removes all the fake names stored for the entities.
     """
-    global MEM_FAKE
-    MEM_FAKE = dict()
+    _STORE.clear()
 
 
-def check_name(original_name, entity):
+def check_name(original_name, entity, key=None, store=None):
     """
     Check if a fake name for the given original name and entity exists.
 
     Parameters:
         original_name (str): The original name for which to check if a fake name exists.
         entity (str): The type of entity for which the fake name is associated.
+        key (str, optional): The secret key of the pseudonyms. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str or None: The fake name associated with the original name and entity if it exists, otherwise None.
+            Always None with a key, since the keyed pseudonyms are not stored (see `keyed_faker`).
     """
+    if key is not None:
+        return None
     clean = clean_string(original_name)
-    return MEM_FAKE.get((clean, entity))
+    return (_STORE if store is None else store).get(clean, entity)
 
 
-def add_name(original_name, entity, fake_name):
+def add_name(original_name, entity, fake_name, key=None, store=None):
     """
     Add a fake name for the given original name and entity.
 
@@ -176,26 +341,53 @@ def add_name(original_name, entity, fake_name):
         original_name (str): The original name for which to add the fake name.
         entity (str): The type of entity associated with the fake name.
         fake_name (str): The fake name to be associated with the original name and entity.
+        key (str, optional): The secret key of the pseudonyms. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
+
+    Returns:
+        str: The fake name of the original name, which is the one stored first if another
+        process added a fake name for it at the same time.
     """
+    if key is not None:
+        return fake_name
     clean = clean_string(original_name)
-    MEM_FAKE[(clean, entity)] = fake_name
+    return (_STORE if store is None else store).put(clean, entity, fake_name)
 
 
+def get_gender_detector():
+    """
+    Get the gender detector.
+
+    The detector parses the name dictionary of gender-guesser (about 50,000 names) when it
+    is created, so it is created once, on first use, and shared by all the threads.
+
+    Returns:
+        gender_guesser.detector.Detector: The detector.
+    """
+    global _GENDER_DETECTOR
+    if _GENDER_DETECTOR is None:
+        with _GENDER_LOCK:
+            if _GENDER_DETECTOR is None:
+                _GENDER_DETECTOR = gender.Detector()
+    return _GENDER_DETECTOR
+
+
+@lru_cache(maxsize=GENDER_CACHE_SIZE)
 def deduce_gender(name):
     """
     Deduce the gender of a given name.
 
+    The genders of the last `GENDER_CACHE_SIZE` names are kept in memory.
+
     Parameters:
         name (str): The name for which to deduce the gender.
 
     Returns:
         str or None: The deduced gender ('male', 'female', 'andy') or None if the gender couldn't be determined.
     """
-    # Create an instance of the Detector class from gender-guesser
-    detector = gender.Detector()
-
     # Get the gender guess for the name
-    gender_guess = detector.get_gender(name)
+    gender_guess = get_gender_detector().get_gender(name)
 
     # Clean up the gender guess and return it
     if gender_guess == "mostly_male":
@@ -208,61 +400,66 @@ def deduce_gender(name):
         return None
 
 
-def fake_name(original_name):
+def fake_name(original_name, key=None, store=None):
     """
     Generate a fake name based on the original name.
 
     Parameters:
         original_name (str): The original name for which to generate the fake name.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake name.
     """
     title = get_title(original_name)
-    fake_name = check_name(original_name, "PERSON")
+    fake_name = check_name(original_name, "PERSON", key=key, store=store)
     if fake_name is None:
-        fake = Faker("fr_CH")
         original_gender = deduce_gender(original_name)
         if title is not None:
-            fake_name = fake.last_name()
+            fake_name = fake_value(original_name, "PERSON", "last_name", key=key)
         elif original_gender == "male":
-            fake_name = fake.name_male()
+            fake_name = fake_value(original_name, "PERSON", "name_male", key=key)
         elif original_gender == "female":
-            fake_name = fake.name_female()
+            fake_name = fake_value(original_name, "PERSON", "name_female", key=key)
         else:
-            fake_name = fake.name()
-    add_name(original_name, "PERSON", fake_name)
+            fake_name = fake_value(original_name, "PERSON", "name", key=key)
+        fake_name = add_name(original_name, "PERSON", fake_name, key=key, store=store)
     if title is not None:
         fake_name = title + " " + fake_name
     return " {} ".format(fake_name)
 
 
-def fake_phone(x):
+def fake_phone(x, key=None, store=None):
     """
     Generate a fake phone number.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): Not used, the phone numbers are not stored.
 
     Returns:
         str: The generated fake phone number.
     """
-    fake = Faker("fr_CH")
     # Generate a random phone number for the specified country
-    return " {} ".format(fake.phone_number())
+    return " {} ".format(fake_value(x, "PHONE_NUMBER", "phone_number", key=key))
 
 
-def fake_swiss_location(input_text):
+def fake_swiss_location(input_text, key=None, store=None):
     """
     Generate a fake Swiss location name or address.
 
     Parameters:
         input_text (str): The input text from which to generate the fake location.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake Swiss location name or address.
     """
-    fake = Faker("fr_CH")
     # Common Swiss address keywords and comma check
     address_keywords = [
         "rue",
@@ -278,35 +475,39 @@ def fake_swiss_location(input_text):
 
     if has_comma:
         # Assume it's an address with comma-separated elements
-        return " {} ".format(fake.address())
+        return " {} ".format(fake_value(input_text, "LOCATION", "address", key=key))
 
     input_lower = input_text.lower()
 
     if any(keyword in input_lower for keyword in address_keywords):
         # Generate a fake full address
-        return " {} ".format(fake.address())
+        return " {} ".format(fake_value(input_text, "LOCATION", "address", key=key))
 
     # Generate a fake Swiss city name
-    fake_city = fake.city()
-    add_name(input_text, "CITY", fake_name)
+    fake_city = check_name(input_text, "CITY", key=key, store=store)
+    if fake_city is None:
+        fake_city = fake_value(input_text, "LOCATION", "city", key=key)
+        fake_city = add_name(input_text, "CITY", fake_city, key=key, store=store)
     return " {} ".format(fake_city)
 
 
-def fake_swiss_french_organization(input_text):
+def fake_swiss_french_organization(input_text, key=None, store=None):
     """
     Generate a fake Swiss French organization name.
 
     Parameters:
         input_text (str): The input text from which to generate the fake organization name.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake Swiss French organization name.
     """
-    out = check_name(input_text, "ORGANIZATION")
+    out = check_name(input_text, "ORGANIZATION", key=key, store=store)
     if out is not None:
         return " {} ".format(out)
 
-    fake = Faker("fr_CH")
     organization_type = None
 
     # Check for common keywords to determine organization type
@@ -319,29 +520,39 @@ def fake_swiss_french_organization(input_text):
 
     # Generate fake organization based on the detected type or default to company
     if organization_type == "university":
-        out = fake.university()
+        out = fake_value(input_text, "ORGANIZATION", "university", key=key)
     elif organization_type == "hospital":
-        out = fake.city() + " Hôpital"
+        out = fake_value(input_text, "ORGANIZATION", "city", key=key) + " Hôpital"
     elif organization_type == "ngo":
-        out = fake.last_name() + " Fondation"
+        out = (
+            fake_value(input_text, "ORGANIZATION", "last_name", key=key) + " Fondation"
+        )
     elif organization_type == "bank":
-        out = fake.last_name() + " Banque"
+        out = fake_value(input_text, "ORGANIZATION", "last_name", key=key) + " Banque"
     elif organization_type == "assurance":
-        out = fake.last_name()() + " Assurance"
+        out = (
+            fake_value(input_text, "ORGANIZATION", "last_name", key=key) + " Assurance"
+        )
     elif organization_type == "law_firm":
-        out = fake.last_name() + " Cabinet d'Avocats"
+        out = (
+            fake_value(input_text, "ORGANIZATION", "last_name", key=key)
+            + " Cabinet d'Avocats"
+        )
     elif organization_type == "notaire":
-        out = fake.last_name() + " Notaire"
+        out = fake_value(input_text, "ORGANIZATION", "last_name", key=key) + " Notaire"
     elif organization_type == "fiduciaire":
-        out = fake.catch_phrase() + " Fiduciaire"
+        out = (
+            fake_value(input_text, "ORGANIZATION", "catch_phrase", key=key)
+            + " Fiduciaire"
+        )
     else:
-        out = fake.company()
+        out = fake_value(input_text, "ORGANIZATION", "company", key=key)
 
-    add_name(input_text, "ORGANIZATION", out)
+    out = add_name(input_text, "ORGANIZATION", out, key=key, store=store)
     return " {} ".format(out)
 
 
-def fake_age(x, min_age=18, max_age=90):
+def fake_age(x, min_age=18, max_age=90, key=None, store=None):
     """
     Generate a fake age between the specified minimum and maximum ages.
 
@@ -349,11 +560,13 @@ def fake_age(x, min_age=18, max_age=90):
         x (str): Not used in the function. Can be any value.
         min_age (int, optional): The minimum age to generate. Default is 18.
         max_age (int, optional): The maximum age to generate. Default is 90.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): Not used, the ages are not stored.
 
     Returns:
         str: The generated fake age.
     """
-    fake = Faker()
+    fake = keyed_faker(x, "AGE", "en_US", key=key)
     today = date.today()
     birth_date = fake.date_of_birth(minimum_age=min_age, maximum_age=max_age)
 
@@ -366,122 +579,139 @@ def fake_age(x, min_age=18, max_age=90):
     return " {} ".format(age)
 
 
-def fake_date(x):
+def fake_date(x, key=None, store=None):
     """
     Generate a fake date.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): Not used, the dates are not stored.
 
     Returns:
         str: The generated fake date in the format "DD.MM.YYYY".
     """
-    fake = Faker("fr_CH")
-    fake_date = fake.date_this_decade()
+    fake_date = fake_value(x, "DATE_TIME", "date_this_decade", key=key)
     return " {} ".format(fake_date.strftime("%d.%m.%Y"))
 
 
-def fake_id(x, length=10):
+def fake_id(x, length=10, key=None, store=None):
     """
     Generate a fake ID of the specified length.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
         length (int, optional): The length of the fake ID. Default is 10.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake ID.
     """
-    fake_id = check_name(x, "ID")
+    fake_id = check_name(x, "ID", key=key, store=store)
     if fake_id is not None:
         return " {} ".format(fake_id)
     characters = string.ascii_letters + string.digits
     # pragma: allowlist secret
-    fake_id = "".join(random.choice(characters) for _ in range(length))  # nosec
-    add_name(x, "ID", fake_id)
+    fake = keyed_faker(x, "ID", key=key)
+    fake_id = "".join(fake.random.choice(characters) for _ in range(length))  # nosec
+    fake_id = add_name(x, "ID", fake_id, key=key, store=store)
     return " {} ".format(fake_id)
 
 
-def fake_url(x):
+def fake_url(x, key=None, store=None):
     """
     Generate a fake URL.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake URL.
     """
-    fake = check_name(x, "URL")
-    if fake is not None:
-        return " {} ".format(fake.url())
-    fake = Faker("fr_CH")
-    add_name(x, "URL", fake)
-    return " {} ".format(fake.url())
+    fake = check_name(x, "URL", key=key, store=store)
+    if fake is None:
+        fake = fake_value(x, "URL", "url", key=key)
+        fake = add_name(x, "URL", fake, key=key, store=store)
+    return " {} ".format(fake)
 
 
-def fake_email(x):
+def fake_email(x, key=None, store=None):
     """
     Generate a fake email address.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake email address.
     """
-    fake = check_name(x, "EMAIL_ADDRESS")
-    if fake is not None:
-        return " {} ".format(fake.url())
-    fake = Faker("fr_CH")
-    add_name(x, "EMAIL_ADDRESS", fake)
-    return " {} ".format(fake.email())
+    fake = check_name(x, "EMAIL_ADDRESS", key=key, store=store)
+    if fake is None:
+        fake = fake_value(x, "EMAIL_ADDRESS", "email", key=key)
+        fake = add_name(x, "EMAIL_ADDRESS", fake, key=key, store=store)
+    return " {} ".format(fake)
 
 
-def fake_swiss_zip_code(x):
+def fake_swiss_zip_code(x, key=None, store=None):
     """
     Generate a fake Swiss ZIP code.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake Swiss ZIP code.
     """
-    fake = check_name(x, "CH_ZIPCODE")
-    if fake is not None:
-        return " {} ".format(fake.url())
-    fake = Faker("fr_CH")
-    add_name(x, "CH_ZIPCODE", fake)
-    return ", {}, ".format(fake.postcode())
+    fake = check_name(x, "CH_ZIPCODE", key=key, store=store)
+    if fake is None:
+        fake = fake_value(x, "CH_ZIPCODE", "postcode", key=key)
+        fake = add_name(x, "CH_ZIPCODE", fake, key=key, store=store)
+    return ", {}, ".format(fake)
 
 
-def fake_bank_account(x):
+def fake_bank_account(x, key=None, store=None):
     """
     Generate a fake bank account number.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): The pseudonym store. Default is the one of
+            `get_pseudonym_store`.
 
     Returns:
         str: The generated fake bank account number.
     """
-    fake = check_name(x, "BANK_ACCOUNT")
-    if fake is not None:
-        return " {} ".format(fake.url())
-    fake = Faker("fr_CH")
-    add_name(x, "BANK_ACCOUNT", fake)
-    return " {} ".format(fake.iban())
+    fake = check_name(x, "BANK_ACCOUNT", key=key, store=store)
+    if fake is None:
+        fake = fake_value(x, "BANK_ACCOUNT", "iban", key=key)
+        fake = add_name(x, "BANK_ACCOUNT", fake, key=key, store=store)
+    return " {} ".format(fake)
 
 
-def fake_address_int(x):
+def fake_address_int(x, key=None, store=None):
     """
     Generate a fake address integer.
 
     Parameters:
         x (str): Not used in the function. Can be any value.
+        key (str, optional): The secret key of the pseudonyms, see `keyed_faker`. Default is None.
+        store (PseudonymStore, optional): Not used, the address numbers are not stored.
 
     Returns:
         str: The generated fake address integer.
     """
-    return "{},".format(random.randint(1, 999))  # nosec
+    return "{},".format(
+        keyed_faker(x, "ADDRESS_NUMBER", key=key).random.randint(1, 999)
+    )  # nosec
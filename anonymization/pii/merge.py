@@ -0,0 +1,162 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+from presidio_analyzer import RecognizerResult
+
+from anonymization.pii.planner import MODEL_ENTITIES
+
+MERGE_POLICIES = ["union", "majority", "max_score", "priority"]
+
+
+def get_detector(result):
+    """
+    Get the detector (camembert, swiss_ner or spacy) that produced a result.
+
+    Parameters:
+        result (RecognizerResult): The result.
+
+    Returns:
+        str: The name of the detector.
+    """
+    if isinstance(result.analysis_explanation, str):
+        return result.analysis_explanation
+    return "spacy"
+
+
+def group_overlaps(results):
+    """
+    Group the results whose spans overlap, with a sort and sweep over the intervals.
+
+    Parameters:
+        results (list): List of RecognizerResult objects.
+
+    Returns:
+        list: The groups (lists of RecognizerResult objects), sorted by start.
+    """
+    groups = []
+    end = None
+    for item in sorted(results, key=lambda r: (r.start, -r.end)):
+        if end is None or item.start >= end:
+            groups.append([item])
+            end = item.end
+        else:
+            groups[-1].append(item)
+            end = max(end, item.end)
+    return groups
+
+
+def _best(group, priorities):
+    """
+    Get the result of a group with the highest priority, then score, then length.
+    """
+    rank = {entity: i for i, entity in enumerate(priorities)}
+    return min(
+        group,
+        key=lambda r: (
+            rank.get(r.entity_type, len(rank)),
+            -r.score,
+            r.start - r.end,
+            r.entity_type,
+        ),
+    )
+
+
+def _covering(group):
+    """
+    Get the longest result of a group, then the one with the highest score.
+    """
+    return min(group, key=lambda r: (r.start - r.end, -r.score, r.entity_type))
+
+
+def _span(items, best):
+    """
+    Build the result covering all the items, typed by the best one.
+    """
+    return RecognizerResult(
+        entity_type=best.entity_type,
+        start=min(r.start for r in items),
+        end=max(r.end for r in items),
+        score=best.score,
+        analysis_explanation=best.analysis_explanation,
+        recognition_metadata=best.recognition_metadata,
+    )
+
+
+def _voters(entity_type, n_detectors, entity_detectors):
+    """
+    Get the number of detectors able to produce an entity type.
+
+    Without `entity_detectors`, the NER models of `MODEL_ENTITIES` and Presidio are assumed
+    to be used, within the limit of `n_detectors`.
+    """
+    if entity_detectors is not None and entity_type in entity_detectors:
+        return entity_detectors[entity_type]
+    models = sum(entity_type in entities for entities in MODEL_ENTITIES.values())
+    return min(n_detectors, models + 1)
+
+
+def merge_results(
+    results, policy="union", priorities=None, n_detectors=None, entity_detectors=None
+):
+    """
+    Merge the results of several detectors into non-overlapping spans.
+
+    The overlapping results are grouped and each group is reduced to one span according to
+    the policy:
+        - "union": the span covering the whole group, typed by its longest result (e.g. a
+          bank name containing a city stays an organization), then by score.
+        - "majority": the span covering the results of the entity type found by more than
+          half of the detectors able to produce it (e.g. only Presidio produces email
+          addresses). Groups without a majority are dropped.
+        - "max_score": the result of the group with the highest score.
+        - "priority": the result of the group whose entity type comes first in `priorities`
+          (ties are broken by score).
+
+    Parameters:
+        results (list): List of RecognizerResult objects.
+        policy (str, optional): The merge policy. Default is "union".
+        priorities (list, optional): Entity types from the highest to the lowest priority.
+            Default is no priority.
+        n_detectors (int, optional): Number of detectors voting with the "majority" policy.
+            Default is the number of detectors found in the results.
+        entity_detectors (dict, optional): Number of detectors able to produce each entity
+            type, see `plan_detectors`. Default is deduced from `MODEL_ENTITIES`.
+
+    Returns:
+        list: The merged RecognizerResult objects, sorted by start.
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unsupported merge policy: {policy}")
+    priorities = [] if priorities is None else priorities
+    if n_detectors is None:
+        n_detectors = len({get_detector(r) for r in results})
+
+    out = []
+    for group in group_overlaps(results):
+        if policy == "max_score":
+            out.append(_best(group, []))
+        elif policy == "priority":
+            out.append(_best(group, priorities))
+        elif policy == "union":
+            out.append(_span(group, _covering(group)))
+        else:
+            votes = dict()
+            for item in group:
+                votes.setdefault(item.entity_type, set()).add(get_detector(item))
+            majority = [
+                e
+                for e in votes
+                if 2 * len(votes[e]) > _voters(e, n_detectors, entity_detectors)
+            ]
+            if majority:
+                entity_type = min(majority, key=lambda e: (-len(votes[e]), e))
+                items = [r for r in group if r.entity_type == entity_type]
+                out.append(_span(items, _best(items, [])))
+    return out
@@ -0,0 +1,144 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import os
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "anonymization", "onnx"
+)
+QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def _import_optimum():
+    """
+    Import the ONNX Runtime classes of optimum, which is an optional dependency.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForTokenClassification
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError as e:
+        raise ImportError(
+            "The onnx backend requires optimum and onnxruntime: "
+            "pip install optimum[onnxruntime]"
+        ) from e
+    return ORTModelForTokenClassification, ORTQuantizer, AutoQuantizationConfig
+
+
+def export_quantized(model_name, cache_dir=None):
+    """
+    Export a token classification model to ONNX and quantize it to int8.
+
+    The weights are quantized dynamically (no calibration data needed). The result is
+    cached, so the export only runs the first time.
+
+    Parameters:
+        model_name (str): Name of the Hugging Face model.
+        cache_dir (str, optional): Directory of the exported models. Default is
+            `~/.cache/anonymization/onnx`.
+
+    Returns:
+        str: The directory containing the quantized model and its tokenizer.
+    """
+    from transformers import AutoTokenizer
+
+    ort_model, ort_quantizer, quantization_config = _import_optimum()
+    cache_dir = DEFAULT_CACHE_DIR if cache_dir is None else cache_dir
+    out_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+    if not os.path.exists(os.path.join(out_dir, QUANTIZED_FILE)):
+        model = ort_model.from_pretrained(model_name, export=True)
+        quantizer = ort_quantizer.from_pretrained(model)
+        qconfig = quantization_config.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    return out_dir
+
+
+def load_onnx_pipeline(model_name, cache_dir=None):
+    """
+    Load an int8 ONNX Runtime NER pipeline.
+
+    The pipeline has the same outputs as the PyTorch one
+    (`entity_group`, `start`, `end`, `score`).
+
+    Parameters:
+        model_name (str): Name of the Hugging Face model.
+        cache_dir (str, optional): Directory of the exported models.
+
+    Returns:
+        transformers.Pipeline: The NER pipeline.
+    """
+    from transformers import AutoTokenizer
+    from transformers import pipeline
+
+    ort_model, _, _ = _import_optimum()
+    model_dir = export_quantized(model_name, cache_dir)
+    model = ort_model.from_pretrained(model_dir, file_name=QUANTIZED_FILE)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    return pipeline(
+        task="ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple"
+    )
+
+
+def quantize_pipeline(ner):
+    """
+    Quantize the linear layers of a PyTorch NER pipeline to int8.
+
+    Used for models that cannot be exported to ONNX (e.g. the X-MOD adapters of SwissBERT).
+
+    Parameters:
+        ner (transformers.Pipeline): The NER pipeline.
+
+    Returns:
+        transformers.Pipeline: The same pipeline with a quantized model.
+    """
+    import torch
+
+    ner.model = torch.quantization.quantize_dynamic(
+        ner.model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return ner
+
+
+def ner_parity(reference, candidate):
+    """
+    Compare the entities found by two NER pipelines on the same texts.
+
+    Parameters:
+        reference (list): Outputs of the reference pipeline, one list of entities per text.
+        candidate (list): Outputs of the candidate pipeline, one list of entities per text.
+
+    Returns:
+        dict: The "precision", "recall" and "f1" of the candidate entities
+        (same `entity_group`, `start` and `end`), and the "max_score_diff" on the shared entities.
+    """
+    n_ref = 0
+    n_cand = 0
+    n_common = 0
+    max_score_diff = 0.0
+    for ref, cand in zip(reference, candidate):
+        ref = {(e["entity_group"], e["start"], e["end"]): e["score"] for e in ref}
+        cand = {(e["entity_group"], e["start"], e["end"]): e["score"] for e in cand}
+        n_ref += len(ref)
+        n_cand += len(cand)
+        for key in ref.keys() & cand.keys():
+            n_common += 1
+            max_score_diff = max(max_score_diff, abs(float(ref[key] - cand[key])))
+    precision = n_common / n_cand if n_cand else 1.0
+    recall = n_common / n_ref if n_ref else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if n_common else 0.0
+    if not n_ref and not n_cand:
+        f1 = 1.0
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "max_score_diff": max_score_diff,
+    }
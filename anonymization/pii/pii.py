@@ -9,21 +9,104 @@
 #
 
 
+import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 from presidio_analyzer import AnalyzerEngine
+from presidio_analyzer import BatchAnalyzerEngine
+from presidio_analyzer import EntityRecognizer
 from presidio_analyzer import RecognizerResult
 from presidio_analyzer.nlp_engine import NlpEngineProvider
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
 from presidio_anonymizer import AnonymizerEngine
-from transformers import pipeline
 
+from anonymization.pii import registry
+from anonymization.pii.cache import AnalysisCache
+from anonymization.pii.cache import config_fingerprint
+from anonymization.pii.chunking import chunk_text
+from anonymization.pii.chunking import count_words
+from anonymization.pii.chunking import merge_chunk_results
 from anonymization.pii.config import gen_default_config
 from anonymization.pii.conversion import hf_ner_res_to_presidio
-from anonymization.pii.custom_recognizer import AddressNumber
-from anonymization.pii.custom_recognizer import BankAcount
-from anonymization.pii.custom_recognizer import SwissZipCode
+from anonymization.pii.merge import MERGE_POLICIES
+from anonymization.pii.merge import merge_results
+from anonymization.pii.onnx_backend import load_onnx_pipeline
+from anonymization.pii.onnx_backend import quantize_pipeline
+from anonymization.pii.planner import CUSTOM_RECOGNIZERS
+from anonymization.pii.planner import load_pattern_registry
+from anonymization.pii.planner import plan_detectors
 from anonymization.utils import improve_text
 
+CAMEMBERT_MODEL = "Jean-Baptiste/camembert-ner-with-dates"
+SWISS_NER_MODEL = "ZurichNLP/swissbert-ner"
+NER_BACKENDS = ["pytorch", "onnx"]
+SPACY_MODELS = {
+    "fr": "fr_core_news_lg",
+    "en": "en_core_web_lg",
+    "de": "de_core_news_lg",
+}
+
+
+def load_camembert(lang, backend="pytorch"):
+    """
+    Load the Camembert NER pipeline (French only).
+
+    With the "onnx" backend, the model is exported to ONNX and quantized to int8.
+    """
+    from transformers import pipeline
+
+    if backend == "onnx":
+        return load_onnx_pipeline(CAMEMBERT_MODEL)
+    return pipeline(
+        task="ner",
+        model=CAMEMBERT_MODEL,
+        tokenizer=CAMEMBERT_MODEL,
+        aggregation_strategy="simple",
+    )
+
+
+def load_swiss_ner(lang, backend="pytorch"):
+    """
+    Load the SwissBERT NER pipeline set up for the given language ('fr' or 'de').
+
+    SwissBERT language adapters (X-MOD) cannot be exported to ONNX, so with the "onnx"
+    backend the linear layers of the PyTorch model are quantized to int8 instead.
+    """
+    from transformers import pipeline
+
+    ner = pipeline(
+        model=SWISS_NER_MODEL,
+        aggregation_strategy="simple",
+    )
+    ner.model.set_default_language(f"{lang}_CH")
+    if backend == "onnx":
+        ner = quantize_pipeline(ner)
+    return ner
+
+
+def load_spacy_analyzer(lang, backend="pytorch"):
+    """
+    Load the Presidio analyzer with the spacy model and the custom recognizers.
+
+    The backend only applies to the transformers models and is ignored.
+    """
+    model_name = SPACY_MODELS.get(lang, SPACY_MODELS["de"])
+    models = [
+        {"lang_code": lang if lang in SPACY_MODELS else "de", "model_name": model_name}
+    ]
+    configuration = {"nlp_engine_name": "spacy", "models": models}
+    provider = NlpEngineProvider(nlp_configuration=configuration)
+    nlp_engine = provider.create_engine()
+    analyzer = AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=[lang])
+
+    # Custom recognizer
+    for recognizer in CUSTOM_RECOGNIZERS:
+        analyzer.registry.add_recognizer(recognizer())
+    return analyzer
+
 
 class PIIDetection(object):
     """
@@ -40,9 +123,36 @@ class PIIDetection(object):
             - "use_camembert" (bool): Whether to use Camembert NER for French. Default is True.
             - "use_swiss_ner" (bool): Whether to use SwissBERT NER for Swiss languages. Default is True.
             - "use_spacy" (bool): Whether to use Spacy for NER. Default is True.
+              The models that cannot produce any of the requested entities are not used, and
+              when no requested entity needs the spacy NLP pipeline, the Presidio pattern
+              recognizers run without it.
+            - "batch_size" (int): Number of texts processed per forward pass. Default is 8.
+            - "chunk_size" (int): Maximum number of tokens analysed at once. Longer texts are split
+              into overlapping chunks. Default is 400.
+            - "chunk_overlap" (int): Number of tokens shared by consecutive chunks. Default is 50.
+            - "merge_policy" (str): How the overlapping results of the detectors are merged into
+              non-overlapping spans: "union", "majority", "max_score", "priority" or None to keep
+              all the results. Default is "union".
+            - "entity_priority" (list): Entity types from the highest to the lowest priority, used
+              by the "priority" merge policy. Default is the "entities" list.
+            - "cache_size" (int): Number of analysed texts kept in the in-memory cache, 0 to
+              disable it. Default is 10000.
+            - "cache_path" (str): Path of a SQLite database where the analysis results are
+              persisted across runs. Default is None.
+            - "ner_backend" (str): Backend of the transformers models, "pytorch" or "onnx" (int8
+              ONNX Runtime, requires optimum[onnxruntime]). Default is "pytorch".
+            - "concurrent" (bool): Whether to run the detectors in parallel threads. Default is False.
+            - "num_threads" (int): Number of torch threads used by each detector in concurrent mode.
+              Default is the number of CPUs divided by the number of detectors.
+            - "workers" (int): Number of processes analysing the texts of a batch, each one with
+              its own copy of the models (see `anonymization.pii.workers`). Default is 1 (no
+              worker process).
 
     Note:
         - The `config` dictionary allows fine-tuning the behavior of the PII detector.
+        - The models are loaded on first use, call `warmup` to load them eagerly.
+        - The models are shared with the other PIIDetection instances of the process through
+          `anonymization.pii.registry`. Call `close` to release them.
 
     Example Usage:
         # Create the PIIDetection instance with default configuration
@@ -61,56 +171,156 @@ class PIIDetection(object):
         self.config = gen_default_config() if config is None else config
         self.entities = set(self.config.get("entities"))
         self.lang = self.config.get("language", "fr")
-        self.camembert_ner = None
-        if self.config.get("use_camembert", True) and self.lang == "fr":
-            self.camembert_ner = pipeline(
-                task="ner",
-                model="Jean-Baptiste/camembert-ner-with-dates",
-                tokenizer="Jean-Baptiste/camembert-ner-with-dates",
-                aggregation_strategy="simple",
+        self.batch_size = self.config.get("batch_size", 8)
+        self.chunk_size = self.config.get("chunk_size", 400)
+        self.chunk_overlap = self.config.get("chunk_overlap", 50)
+        self.merge_policy = self.config.get("merge_policy", "union")
+        if self.merge_policy is not None and self.merge_policy not in MERGE_POLICIES:
+            raise ValueError(f"Unsupported merge policy: {self.merge_policy}")
+        self.entity_priority = self.config.get(
+            "entity_priority", self.config.get("entities")
+        )
+        self.cache = None
+        cache_size = self.config.get("cache_size", 10000)
+        cache_path = self.config.get("cache_path")
+        if cache_size > 0 or cache_path is not None:
+            self.cache = AnalysisCache(
+                config_fingerprint(self.config), max_size=cache_size, path=cache_path
             )
+        self.backend = self.config.get("ner_backend", "pytorch")
+        if self.backend not in NER_BACKENDS:
+            raise ValueError(f"Unsupported NER backend: {self.backend}")
+
+        if self.config.get("use_swiss_ner", True) and self.lang not in ["fr", "de"]:
+            warnings.warn("Swiss NER only available for fr or de")
+
+        # Only the detectors able to produce the requested entities are used
+        self.pattern_registry = load_pattern_registry(self.lang)
+        self.plan = plan_detectors(self.config, self.pattern_registry)
+        self.presidio_entities = self.plan["presidio_entities"]
+        self.pattern_recognizers = []
+        if self.plan["patterns"]:
+            self.pattern_recognizers = [
+                recognizer
+                for recognizer in self.pattern_registry.get_recognizers(
+                    language=self.lang, entities=self.presidio_entities
+                )
+                if not isinstance(recognizer, SpacyRecognizer)
+            ]
+
+        # Enabled models, loaded on first use
+        self._loaders = dict()
+        self._models = dict()
+        self._lock = threading.Lock()
+        self.camembert_model = None
+        if self.plan["camembert"]:
+            self.camembert_model = self._enable(CAMEMBERT_MODEL, load_camembert)
+
+        self.swiss_ner_model = None
+        if self.plan["swiss_ner"]:
+            self.swiss_ner_model = self._enable(SWISS_NER_MODEL, load_swiss_ner)
+
+        self.spacy_model = None
+        if self.plan["spacy"]:
+            model_name = SPACY_MODELS.get(self.lang, SPACY_MODELS["de"])
+            self.spacy_model = self._enable(model_name, load_spacy_analyzer)
+
+        self.concurrent = self.config.get("concurrent", False)
+        self._executor = None
+        self.workers = self.config.get("workers", 1)
+        self._pool = None
+        if self.concurrent:
+            self._set_thread_budget()
+
+    def _enable(self, model_name, loader):
+        """
+        Register a model to be loaded on first use.
 
-        self.swiss_ner = None
-        if self.config.get("use_swiss_ner", True):
-            self.swiss_ner = pipeline(
-                model="ZurichNLP/swissbert-ner",
-                aggregation_strategy="simple",
-            )
-            if self.lang == "de":
-                self.swiss_ner.model.set_default_language("de_CH")
-            elif self.lang == "fr":
-                self.swiss_ner.model.set_default_language("fr_CH")
-            else:
-                print("Swiss NER only available for fr or de")
-                self.swiss_ner = None
-
-        self.spacy_pii = None
-        if self.config.get("use_scapy", True):
-            models = []
-            if self.lang == "fr":
-                models = [
-                    {"lang_code": "fr", "model_name": "fr_core_news_lg"},
-                ]
-            elif self.lang == "en":
-                models = [
-                    {"lang_code": "en", "model_name": "en_core_web_lg"},
-                ]
-            else:
-                models = [
-                    {"lang_code": "de", "model_name": "de_core_news_lg"},
-                ]
-            configuration = {"nlp_engine_name": "spacy", "models": models}
-            provider = NlpEngineProvider(nlp_configuration=configuration)
-            nlp_engine = provider.create_engine()
-            analyzer = AnalyzerEngine(
-                nlp_engine=nlp_engine, supported_languages=[self.lang]
-            )
+        Returns:
+            str: The name of the model in the registry, which includes the backend (or
+            "int8" for SwissBERT, which is quantized with PyTorch instead of exported).
+        """
+        if self.backend == "onnx" and loader is load_swiss_ner:
+            model_name = f"{model_name}:int8"
+        elif self.backend != "pytorch" and loader is not load_spacy_analyzer:
+            model_name = f"{model_name}:{self.backend}"
+        self._loaders[model_name] = loader
+        return model_name
+
+    def _get_model(self, model_name):
+        """
+        Get an enabled model, loading it through the model registry on first use.
+        """
+        if model_name is None:
+            return None
+        with self._lock:
+            if model_name not in self._models:
+                loader = self._loaders[model_name]
+                self._models[model_name] = registry.acquire(
+                    model_name, self.lang, lambda: loader(self.lang, self.backend)
+                )
+            return self._models[model_name]
+
+    @property
+    def camembert_ner(self):
+        """Camembert NER pipeline, or None if disabled."""
+        return self._get_model(self.camembert_model)
+
+    @property
+    def swiss_ner(self):
+        """SwissBERT NER pipeline, or None if disabled."""
+        return self._get_model(self.swiss_ner_model)
+
+    @property
+    def spacy_pii(self):
+        """Presidio analyzer with the spacy model, or None if disabled."""
+        return self._get_model(self.spacy_model)
+
+    def warmup(self):
+        """
+        Load all the enabled models now instead of on first use.
 
-            # Custom recognizer
-            analyzer.registry.add_recognizer(BankAcount())
-            analyzer.registry.add_recognizer(SwissZipCode())
-            analyzer.registry.add_recognizer(AddressNumber())
-            self.spacy_pii = analyzer
+        Returns:
+            PIIDetection: The detector itself.
+        """
+        for model_name in self._loaders:
+            self._get_model(model_name)
+        return self
+
+    def close(self):
+        """
+        Release the models held by this detector.
+
+        A model is unloaded when no other detector of the process uses it.
+        The detector loads them again if it is used after being closed.
+        """
+        with self._lock:
+            for model_name, model in self._models.items():
+                registry.release(model_name, self.lang, model)
+            self._models = dict()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        if self.cache is not None:
+            self.cache.close()
+
+    def _set_thread_budget(self):
+        """
+        Share the CPUs between the detectors running in parallel.
+
+        Each thread calling torch gets its own team of `num_threads` intra-op threads,
+        so the budget is divided by the number of detectors to avoid oversubscription.
+        """
+        import torch
+
+        n_detectors = max(1, len(self._detectors()))
+        num_threads = self.config.get(
+            "num_threads", max(1, (os.cpu_count() or 1) // n_detectors)
+        )
+        torch.set_num_threads(num_threads)
 
     def _filter(self, list):
         """
@@ -128,11 +338,39 @@ class PIIDetection(object):
                 out.append(item)
         return out
 
+    def _count_tokens(self, text):
+        """
+        Count the tokens of a text with the tokenizer of the loaded NER model.
+
+        Falls back to counting words when no Hugging Face model is loaded.
+        """
+        if self.camembert_model is not None:
+            ner = self.camembert_ner
+        elif self.swiss_ner_model is not None:
+            ner = self.swiss_ner
+        else:
+            return count_words(text)
+        return len(ner.tokenizer.tokenize(text))
+
+    def _chunk(self, text):
+        """
+        Split a text into the (start, end) spans of its chunks.
+        """
+        # A token spans at least one character
+        if len(text) <= self.chunk_size:
+            return [(0, len(text))]
+        return chunk_text(
+            text, self.chunk_size, self.chunk_overlap, count_tokens=self._count_tokens
+        )
+
     def analyse(self, text: str):
         """
         Perform named entity recognition (NER) and personally
         identifiable information (PII) analysis on the input text.
 
+        Texts longer than `chunk_size` tokens are split into overlapping chunks,
+        see `analyse_batch`.
+
         Args:
             text (str): The input text to be analyzed.
 
@@ -140,21 +378,154 @@ class PIIDetection(object):
             list: A list containing the analysis results
             for named entities and PII found in the text.
         """
+        return self.analyse_batch([text])[0]
+
+    def analyse_batch(self, texts: List[str], batch_size: int = None):
+        """
+        Perform NER and PII analysis on a list of texts.
+
+        The texts are fed to the Hugging Face pipelines and to the spaCy/Presidio
+        analyzer in batches instead of one forward pass per text. Long texts are split
+        into overlapping chunks of at most `chunk_size` tokens, the chunks are analysed
+        in the same batches and their results are mapped back to the original text.
+        Texts already in the analysis cache, and repeated texts, are analysed only once.
+
+        Args:
+            texts (list): The input texts to be analyzed.
+            batch_size (int, optional): Number of texts processed per forward pass.
+                Default is the "batch_size" of the configuration.
+
+        Returns:
+            list: One list of RecognizerResult objects per input text, in the input order.
+        """
+        batch_size = self.batch_size if batch_size is None else batch_size
+        texts = list(texts)
+        if self.cache is None:
+            return self._dispatch(texts, batch_size)
+
+        out = [self.cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(t for t, res in zip(texts, out) if res is None))
+        results = self._dispatch(missing, batch_size)
+        self.cache.put_many(missing, results)
+        results = dict(zip(missing, results))
+        return [res if res is not None else results[t] for t, res in zip(texts, out)]
+
+    def _dispatch(self, texts, batch_size):
+        """
+        Analyse the texts in this process, or in the worker processes if "workers" > 1.
+
+        With workers, even a single text is analysed by a worker, so that the models are
+        never loaded in this process.
+        """
+        if self.workers <= 1:
+            return self._analyse_batch(texts, batch_size)
+        if not texts:
+            return []
+        if self._pool is None:
+            from anonymization.pii.workers import DetectionPool
+
+            self._pool = DetectionPool(self.config, self.workers)
+        return self._pool.analyse_batch(texts, batch_size)
+
+    def _analyse_batch(self, texts, batch_size):
+        """
+        Analyse a list of texts, splitting the long ones into chunks.
+        """
+        chunks = [self._chunk(text) for text in texts]
+        pieces = [
+            text[start:end]
+            for text, spans in zip(texts, chunks)
+            for start, end in spans
+        ]
+        res = iter(self._detect_batch(pieces, batch_size))
+
+        out = []
+        for text, spans in zip(texts, chunks):
+            tmp = [next(res) for _ in spans]
+            tmp = merge_chunk_results(spans, tmp, len(text))
+            if self.merge_policy is not None:
+                tmp = merge_results(
+                    tmp,
+                    policy=self.merge_policy,
+                    priorities=self.entity_priority,
+                    n_detectors=len(self._detectors()),
+                    entity_detectors=self.plan["entity_detectors"],
+                )
+            out.append(tmp)
+        return out
+
+    def _run_camembert(self, texts, batch_size):
+        res = self.camembert_ner(texts, batch_size=batch_size)
+        return [self._filter(hf_ner_res_to_presidio(tmp, "camembert")) for tmp in res]
+
+    def _run_swiss_ner(self, texts, batch_size):
+        res = self.swiss_ner(texts, batch_size=batch_size)
+        return [self._filter(hf_ner_res_to_presidio(tmp, "swiss_ner")) for tmp in res]
+
+    def _run_spacy(self, texts, batch_size):
+        batch_analyzer = BatchAnalyzerEngine(analyzer_engine=self.spacy_pii)
+        res = batch_analyzer.analyze_iterator(
+            texts,
+            language=self.lang,
+            batch_size=batch_size,
+            entities=self.presidio_entities,
+        )
+        return [self._filter(tmp) for tmp in res]
+
+    def _run_patterns(self, texts, batch_size):
         out = []
-        if self.camembert_ner is not None:
-            tmp = self.camembert_ner(text)
-            tmp = hf_ner_res_to_presidio(tmp, "camembert")
-            out += self._filter(tmp)
+        for text in texts:
+            tmp = []
+            for recognizer in self.pattern_recognizers:
+                tmp += recognizer.analyze(
+                    text=text, entities=self.presidio_entities, nlp_artifacts=None
+                )
+            out.append(self._filter(EntityRecognizer.remove_duplicates(tmp)))
+        return out
 
-        if self.swiss_ner is not None:
-            tmp = self.swiss_ner(text)
-            tmp = hf_ner_res_to_presidio(tmp, "swiss_ner")
-            out += self._filter(tmp)
+    def _detectors(self):
+        """
+        List the detection functions of the loaded models, in a fixed order.
+        """
+        out = []
+        if self.camembert_model is not None:
+            out.append(self._run_camembert)
+        if self.swiss_ner_model is not None:
+            out.append(self._run_swiss_ner)
+        if self.spacy_model is not None:
+            out.append(self._run_spacy)
+        if self.pattern_recognizers:
+            out.append(self._run_patterns)
+        return out
 
-        if self.spacy_pii is not None:
-            tmp = self.spacy_pii.analyze(text=text, language=self.lang)
-            out += self._filter(tmp)
+    def _detect_batch(self, texts, batch_size):
+        """
+        Run the detectors on a list of texts that fit in the models.
 
+        Blank texts are skipped, so the models are not loaded for them. In concurrent
+        mode the detectors run in parallel threads. The results are gathered in the
+        same order as in sequential mode.
+        """
+        out = [[] for _ in texts]
+        indices = [i for i, text in enumerate(texts) if text.strip()]
+        texts = [texts[i] for i in indices]
+        if not texts:
+            return out
+
+        detectors = self._detectors()
+        if self.concurrent and len(detectors) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(detectors))
+            futures = [
+                self._executor.submit(run, texts, batch_size) for run in detectors
+            ]
+            results = [future.result() for future in futures]
+        else:
+            results = [run(texts, batch_size) for run in detectors]
+
+        for res in results:
+            for i, tmp in zip(indices, res):
+                out[i] += tmp
         return out
 
 
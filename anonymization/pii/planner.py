@@ -0,0 +1,95 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+from presidio_analyzer import RecognizerRegistry
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+from anonymization.pii.custom_recognizer import AddressNumber
+from anonymization.pii.custom_recognizer import BankAcount
+from anonymization.pii.custom_recognizer import SwissZipCode
+
+# Entities produced by the transformers models (after MODEL_TO_PRESIDIO_MAPPING)
+MODEL_ENTITIES = {
+    "camembert": ["PERSON", "LOCATION", "ORGANIZATION", "MISC", "DATE_TIME"],
+    "swiss_ner": ["PERSON", "LOCATION", "ORGANIZATION", "MISC"],
+}
+
+# Entities that need the spacy NLP pipeline
+SPACY_ENTITIES = SpacyRecognizer.ENTITIES
+
+CUSTOM_RECOGNIZERS = [BankAcount, SwissZipCode, AddressNumber]
+
+
+def load_pattern_registry(lang):
+    """
+    Load the Presidio recognizers that do not need the spacy NLP pipeline.
+
+    Parameters:
+        lang (str): The language of the texts.
+
+    Returns:
+        RecognizerRegistry: The predefined and custom recognizers.
+    """
+    registry = RecognizerRegistry(supported_languages=[lang])
+    registry.load_predefined_recognizers(languages=[lang])
+    for recognizer in CUSTOM_RECOGNIZERS:
+        registry.add_recognizer(recognizer())
+    return registry
+
+
+def plan_detectors(config, pattern_registry):
+    """
+    Select the detectors able to produce the requested entities.
+
+    Parameters:
+        config (dict): Anonymization configuration.
+        pattern_registry (RecognizerRegistry): The recognizers returned by `load_pattern_registry`.
+
+    Returns:
+        dict: The plan with the following keys:
+            - "camembert" (bool): Whether to run Camembert NER.
+            - "swiss_ner" (bool): Whether to run SwissBERT NER.
+            - "spacy" (bool): Whether to run the Presidio analyzer with the spacy NLP pipeline.
+            - "patterns" (bool): Whether to run the Presidio recognizers without NLP pipeline
+              (only when "spacy" is False).
+            - "presidio_entities" (list): The requested entities Presidio can produce.
+            - "entity_detectors" (dict): Number of the selected detectors able to produce each
+              entity type, used by the "majority" merge policy.
+    """
+    entities = set(config.get("entities"))
+    lang = config.get("language", "fr")
+    use_spacy = config.get("use_spacy", config.get("use_scapy", True))
+
+    recognizers = pattern_registry.get_recognizers(language=lang, all_fields=True)
+    supported = {e for recognizer in recognizers for e in recognizer.supported_entities}
+    presidio_entities = sorted(entities & supported) if use_spacy else []
+    spacy = bool(entities & set(SPACY_ENTITIES)) and use_spacy
+
+    plan = {
+        "camembert": config.get("use_camembert", True)
+        and lang == "fr"
+        and bool(entities & set(MODEL_ENTITIES["camembert"])),
+        "swiss_ner": config.get("use_swiss_ner", True)
+        and lang in ["fr", "de"]
+        and bool(entities & set(MODEL_ENTITIES["swiss_ner"])),
+        "spacy": spacy,
+        "patterns": bool(presidio_entities) and not spacy,
+        "presidio_entities": presidio_entities,
+    }
+
+    entity_detectors = dict()
+    for detector, detector_entities in MODEL_ENTITIES.items():
+        if plan[detector]:
+            for entity in entities & set(detector_entities):
+                entity_detectors[entity] = entity_detectors.get(entity, 0) + 1
+    for entity in presidio_entities:
+        entity_detectors[entity] = entity_detectors.get(entity, 0) + 1
+    plan["entity_detectors"] = entity_detectors
+    return plan
@@ -0,0 +1,111 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import math
+import numbers
+import re
+from datetime import date
+from datetime import time
+
+# Number with optional thousands separators (1'250, 3 000) and decimal part (.50, ,00, .-)
+_NUMBER = r"[+-]?(?:\d{1,6}|[1-9]\d{0,2}(?:['’ ]\d{3})+)"
+_DECIMAL = r"(?:[.,]\d{1,2}|\.-)"
+
+# Texts matching one of these patterns (in full) cannot contain PII
+DEFAULT_PATTERNS = [
+    # Punctuation and symbols only
+    r"[\W_]+",
+    # Amounts with a currency: CHF 12.-, -3 000,00 CHF, 5%
+    r"(?:CHF|EUR|USD|Fr\.)\s?" + _NUMBER + _DECIMAL + "?",
+    _NUMBER + _DECIMAL + r"?\s?(?:CHF|EUR|USD|%)",
+    # Amounts with a decimal part: 1'250.50, but not the phone numbers (079 563 684)
+    _NUMBER + _DECIMAL,
+    # ISO dates and times: 2023-01-31, 2023-01-31T12:00:00Z
+    r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?",
+]
+
+
+class PreScreen(object):
+    """
+    Cheap gate that skips the NER models on values that cannot contain PII.
+
+    A value is skipped if it is missing, a boolean, a date or a number below one million, if
+    its text is shorter than `prescreen_min_length` characters, or if its text fully matches
+    one of the `prescreen_patterns` (amounts with a currency or a decimal part, ISO dates and
+    pure punctuation by default). Texts of digits only, such as phone numbers or identifiers,
+    are analysed.
+
+    The statistics count the values given to `skip`. Since the anonymizer gets each distinct
+    value of a column (or chunk) once, they count distinct values, not cells.
+
+    Args:
+        config (dict): Configuration dictionary with the following optional keys:
+            - "prescreen" (bool): Whether to pre-screen the values. Default is True.
+            - "prescreen_min_length" (int): Minimum number of non-blank characters of a value
+              to be analysed. Default is 2.
+            - "prescreen_patterns" (list): Regular expressions of the texts that bypass the
+              NER models. Default is `DEFAULT_PATTERNS`.
+
+    Example Usage:
+        prescreen = PreScreen(config)
+        texts = [value for value in values if not prescreen.skip(value)]
+        print(prescreen.stats())
+    """
+
+    def __init__(self, config) -> None:
+        self.enabled = config.get("prescreen", True)
+        self.min_length = config.get("prescreen_min_length", 2)
+        patterns = config.get("prescreen_patterns", DEFAULT_PATTERNS)
+        self.pattern = None
+        if patterns:
+            self.pattern = re.compile("|".join(f"(?:{p})" for p in patterns))
+        self.checked = 0
+        self.skipped = 0
+
+    def skip(self, value):
+        """
+        Check whether a value can bypass the NER models.
+
+        Parameters:
+            value: The value of a cell.
+
+        Returns:
+            bool: True if the value cannot contain PII.
+        """
+        if not self.enabled:
+            return False
+        self.checked += 1
+        if self._skip(value):
+            self.skipped += 1
+            return True
+        return False
+
+    def _skip(self, value):
+        if value is None or isinstance(value, (bool, date, time)):
+            return True
+        if isinstance(value, float) and math.isnan(value):
+            return True
+        if isinstance(value, numbers.Real) and abs(value) < 1e6:
+            # Larger numbers can be phone numbers or identifiers
+            return True
+        text = str(value).strip()
+        if len(text) < self.min_length:
+            return True
+        return self.pattern is not None and self.pattern.fullmatch(text) is not None
+
+    def stats(self):
+        """
+        Get the pre-screening statistics.
+
+        Returns:
+            dict: The number of "checked" and "skipped" values (distinct values of the
+            columns, see the class documentation).
+        """
+        return {"checked": self.checked, "skipped": self.skipped}
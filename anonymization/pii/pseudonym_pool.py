@@ -0,0 +1,202 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import re
+import string
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from faker import Faker
+from faker.providers import address
+from faker.providers import person
+
+# Provider methods generated in bulk, with their Faker implementation and the list of
+# words or formats it draws from (e.g. "{{first_name_male}} {{last_name}}" or "1###")
+BULK = {
+    "first_name": (person.Provider.first_name, "first_names"),
+    "first_name_male": (person.Provider.first_name_male, "first_names_male"),
+    "first_name_female": (person.Provider.first_name_female, "first_names_female"),
+    "last_name": (person.Provider.last_name, "last_names"),
+    "name": (person.Provider.name, "formats"),
+    "name_male": (person.Provider.name_male, "formats_male"),
+    "name_female": (person.Provider.name_female, "formats_female"),
+    "city": (address.Provider.city, "city_formats"),
+    "city_suffix": (address.Provider.city_suffix, "city_suffixes"),
+    "postcode": (address.Provider.postcode, "postcode_formats"),
+}
+# Methods drawing formats with "{{token}}" placeholders, and with "#" digit placeholders
+FORMATS = ["name", "name_male", "name_female", "city"]
+NUMBERS = ["postcode"]
+TOKEN = re.compile(r"{{\s*(\w+)\s*}}")
+# Placeholders of Faker.bothify other than "#"
+BOTHIFY = re.compile(r"[%!@?^$]")
+
+
+class PseudonymPool(object):
+    """
+    Pools of fake values generated in bulk ahead of time, one pool per Faker provider
+    method (e.g. "name_male", "city" or "iban").
+
+    A pool is filled with `size` values on its first draw, then a draw only pops the next
+    value. The names, cities and postcodes are generated in bulk from the word lists of the
+    Faker providers, see `generate`. When a pool is down to a quarter of its size, it is refilled in a background
+    thread with its own Faker generator. Without background refill (e.g. for reproducible
+    runs), the pools are refilled in bulk by the drawing thread.
+
+    Args:
+        locale (str, optional): The Faker locale. Default is "fr_CH".
+        size (int, optional): Number of values generated at once. Default is 1000.
+        background (bool, optional): Whether to refill the pools in a background thread.
+            Default is True.
+
+    Example Usage:
+        pool = PseudonymPool(size=1000)
+        name = pool.draw("name_female", get_faker())
+        pool.close()
+    """
+
+    def __init__(self, locale="fr_CH", size=1000, background=True) -> None:
+        self.locale = locale
+        self.size = size
+        self._values = dict()
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._fake = None
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+
+    def _refill(self, method):
+        """
+        Generate `size` values in the refill thread.
+        """
+        if self._fake is None:
+            self._fake = Faker(self.locale)
+        return generate(self._fake, method, self.size)
+
+    def draw(self, method, fake):
+        """
+        Draw a fake value.
+
+        Parameters:
+            method (str): The Faker provider method, without argument.
+            fake (Faker): The generator of the drawing thread, used when the pool is empty
+                and no refill is pending.
+
+        Returns:
+            The fake value.
+        """
+        with self._lock:
+            values = self._values.setdefault(method, deque())
+            pending = self._pending.get(method)
+            if pending is not None and (not values or pending.done()):
+                values.extend(pending.result())
+                del self._pending[method]
+                pending = None
+            if not values:
+                values.extend(generate(fake, method, self.size))
+            value = values.popleft()
+            if (
+                self._executor is not None
+                and pending is None
+                and len(values) < self.size // 4
+            ):
+                self._pending[method] = self._executor.submit(self._refill, method)
+        return value
+
+    def close(self):
+        """
+        Stop the refill thread.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _elements(fake, method):
+    """
+    Get the elements and weights (or None) drawn by a provider method, or None if the method
+    is not generated in bulk (e.g. when the provider of the locale replaces it).
+    """
+    if method not in BULK:
+        return None, None
+    function, attribute = BULK[method]
+    provider = getattr(getattr(fake, method, None), "__self__", None)
+    if getattr(type(provider), method, None) is not function:
+        return None, None
+    elements = getattr(provider, attribute, None)
+    if not elements or (method in NUMBERS and BOTHIFY.search("".join(elements))):
+        return None, None
+    if isinstance(elements, dict):
+        return list(elements), list(elements.values())
+    return list(elements), None
+
+
+def _numerify(fake, values):
+    """
+    Replace the "#" of the values with random digits.
+    """
+    digits = iter(
+        fake.random.choices(string.digits, k=sum(v.count("#") for v in values))
+    )
+    return [
+        value.replace("#", "{}").format(
+            *(next(digits) for _ in range(value.count("#")))
+        )
+        for value in values
+    ]
+
+
+def _parse(fake, values):
+    """
+    Replace the "{{token}}" of the formats with fake values, generating the values of each
+    token of a format at once.
+    """
+    indices = dict()
+    for i, value in enumerate(values):
+        indices.setdefault(value, []).append(i)
+    out = [None] * len(values)
+    for value, group in indices.items():
+        parts = TOKEN.split(value)
+        # The parts alternate between the text around the tokens and the tokens
+        columns = [
+            generate(fake, part, len(group)) if i % 2 else [part] * len(group)
+            for i, part in enumerate(parts)
+        ]
+        for i, pieces in zip(group, zip(*columns)):
+            out[i] = "".join(pieces)
+    return out
+
+
+def generate(fake, method, count):
+    """
+    Generate fake values in bulk.
+
+    The names, cities and postcodes (see `BULK`) are drawn at once from the word lists of
+    the providers with `random.choices`, with the same distribution as Faker, which is
+    several times faster than calling the provider for each value. The other methods, and
+    the ones replaced by the provider of the locale, are called for each value.
+
+    Parameters:
+        fake (Faker): The generator.
+        method (str): The Faker provider method, without argument.
+        count (int): Number of values.
+
+    Returns:
+        list: The fake values.
+    """
+    elements, weights = _elements(fake, method)
+    if elements is None:
+        provider = getattr(fake, method)
+        return [provider() for _ in range(count)]
+    values = fake.random.choices(elements, weights, k=count)
+    if method in FORMATS:
+        return _parse(fake, values)
+    if method in NUMBERS:
+        return _numerify(fake, values)
+    return values
@@ -0,0 +1,241 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class PseudonymStore(object):
+    """
+    Bounded in-memory store of the pseudonyms generated for the original texts.
+
+    The pseudonyms are stored under the cleaned original text and the entity type, so that
+    a name gets the same pseudonym each time it appears. The last `max_size` pseudonyms are
+    kept (LRU) and the store can be used from several threads.
+
+    Args:
+        max_size (int, optional): Maximum number of pseudonyms kept in memory.
+            Default is 100000.
+
+    Example Usage:
+        store = PseudonymStore(max_size=1000)
+        fake = store.put("jean dupont", "PERSON", "Paul Martin")
+        print(store.get("jean dupont", "PERSON"))
+    """
+
+    def __init__(self, max_size=100000) -> None:
+        self.max_size = max_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, pseudonym):
+        self._memory[key] = pseudonym
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys):
+        """
+        Look up the keys that are not in memory, see `SQLitePseudonymStore`.
+        """
+        return {}
+
+    def _insert(self, items):
+        """
+        Store new pseudonyms, see `SQLitePseudonymStore`.
+
+        Returns:
+            dict: The pseudonyms stored under the keys.
+        """
+        stored = {}
+        for key, pseudonym in items:
+            stored.setdefault(key, self._memory.get(key, pseudonym))
+        return stored
+
+    def get(self, original, entity):
+        """
+        Get the pseudonym of an original text.
+
+        Parameters:
+            original (str): The cleaned original text.
+            entity (str): The entity type.
+
+        Returns:
+            str or None: The pseudonym, or None if there is none.
+        """
+        return self.get_many([(original, entity)])[0]
+
+    def get_many(self, keys):
+        """
+        Get the pseudonyms of several original texts at once.
+
+        Parameters:
+            keys (list): The (original text, entity type) pairs.
+
+        Returns:
+            list: The pseudonym (or None) of each key.
+        """
+        with self._lock:
+            out = [self._memory.get(key) for key in keys]
+            for key, pseudonym in zip(keys, out):
+                if pseudonym is not None:
+                    self._memory.move_to_end(key)
+            missing = list({key for key, p in zip(keys, out) if p is None})
+            if missing:
+                found = self._lookup(missing)
+                for key, pseudonym in found.items():
+                    self._remember(key, pseudonym)
+                out = [found.get(key) if p is None else p for key, p in zip(keys, out)]
+        return out
+
+    def put(self, original, entity, pseudonym):
+        """
+        Store the pseudonym of an original text.
+
+        Parameters:
+            original (str): The cleaned original text.
+            entity (str): The entity type.
+            pseudonym (str): The pseudonym.
+
+        Returns:
+            str: The stored pseudonym, which is the one of another process if it stored a
+            pseudonym for the same text first.
+        """
+        return self.put_many([((original, entity), pseudonym)])[0]
+
+    def put_many(self, items):
+        """
+        Store several pseudonyms at once.
+
+        Parameters:
+            items (list): The ((original text, entity type), pseudonym) pairs.
+
+        Returns:
+            list: The stored pseudonym of each item.
+        """
+        with self._lock:
+            stored = self._insert(items)
+            for key, pseudonym in stored.items():
+                self._remember(key, pseudonym)
+        return [stored[key] for key, _ in items]
+
+    def clear(self):
+        """
+        Remove all the pseudonyms.
+        """
+        with self._lock:
+            self._memory.clear()
+
+    def __len__(self):
+        return len(self._memory)
+
+    def close(self):
+        """
+        Release the resources of the store.
+        """
+        pass
+
+
+class SQLitePseudonymStore(PseudonymStore):
+    """
+    Pseudonym store backed by a SQLite database, which can be shared by several processes
+    and reused across runs.
+
+    The database is opened in WAL mode, so that the processes read it while another one
+    writes. A pseudonym is never replaced: when two processes generate a pseudonym for the
+    same text, the first one stored is used by both. The recently used pseudonyms are also
+    kept in memory.
+
+    Args:
+        path (str): Path of the SQLite database.
+        max_size (int, optional): Maximum number of pseudonyms kept in memory.
+            Default is 100000.
+
+    Example Usage:
+        store = SQLitePseudonymStore("pseudonyms.db")
+        fake = store.put("jean dupont", "PERSON", "Paul Martin")
+        store.close()
+    """
+
+    def __init__(self, path, max_size=100000) -> None:
+        super().__init__(max_size)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pseudonyms (original TEXT, entity TEXT, "
+            "pseudonym TEXT, PRIMARY KEY (original, entity))"
+        )
+        self._db.commit()
+
+    def _select(self, keys):
+        found = {}
+        # Stay below the SQLite limit of variables per query
+        for i in range(0, len(keys), 400):
+            part = keys[i : i + 400]  # noqa: E203
+            condition = " OR ".join(["(original = ? AND entity = ?)"] * len(part))
+            rows = self._db.execute(
+                "SELECT original, entity, pseudonym FROM pseudonyms WHERE " + condition,
+                [value for key in part for value in key],
+            )
+            found.update({(original, entity): p for original, entity, p in rows})
+        return found
+
+    def _lookup(self, keys):
+        return self._select(keys)
+
+    def _insert(self, items):
+        with self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO pseudonyms (original, entity, pseudonym) "
+                "VALUES (?, ?, ?)",
+                [(original, entity, p) for (original, entity), p in items],
+            )
+        return self._select(list({key for key, _ in items}))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            with self._db:
+                self._db.execute("DELETE FROM pseudonyms")
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pseudonyms").fetchone()[0]
+
+    def close(self):
+        """
+        Close the SQLite database.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def make_pseudonym_store(config):
+    """
+    Create the pseudonym store of a configuration.
+
+    Parameters:
+        config (dict): Anonymization configuration, with the optional keys
+            "pseudonym_store_size" (default 100000) and "pseudonym_store_path"
+            (default None, memory only).
+
+    Returns:
+        PseudonymStore: The store.
+    """
+    max_size = config.get("pseudonym_store_size", 100000)
+    path = config.get("pseudonym_store_path")
+    if path is None:
+        return PseudonymStore(max_size)
+    return SQLitePseudonymStore(path, max_size)
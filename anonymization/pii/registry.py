@@ -0,0 +1,98 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import threading
+
+# (model name, language) -> [model, reference count]
+MODELS = dict()
+_LOCK = threading.RLock()
+
+
+def acquire(name, language, loader):
+    """
+    Get a shared model, loading it if it is not in the registry yet.
+
+    Each call increments the reference count of the model and must be balanced by
+    a call to `release` with the returned model.
+
+    Parameters:
+        name (str): Name of the model.
+        language (str): Language the model is configured for.
+        loader (callable): Function called without arguments to load the model.
+
+    Returns:
+        object: The shared model.
+    """
+    key = (name, language)
+    with _LOCK:
+        if key not in MODELS:
+            MODELS[key] = [loader(), 0]
+        MODELS[key][1] += 1
+        return MODELS[key][0]
+
+
+def release(name, language, model):
+    """
+    Release a model obtained with `acquire`.
+
+    The model is removed from the registry when it is no longer referenced. Releasing a
+    copy that is no longer in the registry (e.g. after `evict`) does nothing, so that the
+    references to the new copy are kept.
+
+    Parameters:
+        name (str): Name of the model.
+        language (str): Language the model is configured for.
+        model (object): The model returned by `acquire`.
+    """
+    key = (name, language)
+    with _LOCK:
+        entry = MODELS.get(key)
+        if entry is None or entry[0] is not model:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del MODELS[key]
+
+
+def evict(name=None, language=None):
+    """
+    Remove models from the registry, whatever their reference count.
+
+    The holders of an evicted model keep using it, but the next call to `acquire`
+    loads a new copy, which is not affected when they release the evicted one.
+
+    Parameters:
+        name (str, optional): Name of the models to evict. Default is all names.
+        language (str, optional): Language of the models to evict. Default is all languages.
+
+    Returns:
+        int: The number of evicted models.
+    """
+    with _LOCK:
+        keys = [
+            key
+            for key in MODELS
+            if (name is None or key[0] == name)
+            and (language is None or key[1] == language)
+        ]
+        for key in keys:
+            del MODELS[key]
+    return len(keys)
+
+
+def loaded_models():
+    """
+    List the models in the registry.
+
+    Returns:
+        dict: The reference count of each (model name, language) in the registry.
+    """
+    with _LOCK:
+        return {key: entry[1] for key, entry in MODELS.items()}
@@ -0,0 +1,115 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Detector of the worker process, created once by the pool initializer
+_DETECTOR = None
+
+
+def worker_config(config, workers):
+    """
+    Get the configuration of the detectors of the worker processes.
+
+    The cache and the pre-screening stay in the main process, and the CPUs are shared
+    between the workers.
+
+    Parameters:
+        config (dict): Anonymization configuration.
+        workers (int): Number of worker processes.
+
+    Returns:
+        dict: The configuration of the workers.
+    """
+    config = dict(config, workers=1, cache_size=0, cache_path=None, concurrent=False)
+    config.setdefault("num_threads", max(1, (os.cpu_count() or 1) // workers))
+    return config
+
+
+def _init_worker(config):
+    """
+    Load the models of the worker process.
+    """
+    global _DETECTOR
+    from anonymization.pii.pii import PIIDetection
+
+    try:
+        import torch
+
+        torch.set_num_threads(config["num_threads"])
+    except ImportError:
+        pass
+    _DETECTOR = PIIDetection(config).warmup()
+
+
+def _analyse(args):
+    """
+    Analyse a shard of texts in the worker process.
+    """
+    texts, batch_size = args
+    return _DETECTOR._analyse_batch(texts, batch_size)
+
+
+class DetectionPool(object):
+    """
+    Pool of processes running the PII detection, with one detector (and one copy of the
+    models) per process.
+
+    The processes are started with "spawn", so that they do not inherit the torch threads of
+    the main process, and each one loads the models once in its initializer. Only the
+    analysis runs in the workers: the anonymization, and so the memory of the pseudonyms,
+    stays in the main process, which keeps the pseudonyms consistent.
+
+    Args:
+        config (dict): Anonymization configuration.
+        workers (int): Number of worker processes.
+
+    Example Usage:
+        pool = DetectionPool(config, workers=4)
+        results = pool.analyse_batch(texts, batch_size=8)
+        pool.close()
+    """
+
+    def __init__(self, config, workers) -> None:
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(worker_config(config, workers),),
+        )
+
+    def analyse_batch(self, texts, batch_size):
+        """
+        Analyse a list of texts split in contiguous shards, one per worker.
+
+        Parameters:
+            texts (list): The input texts to be analyzed.
+            batch_size (int): Number of texts processed per forward pass.
+
+        Returns:
+            list: One list of RecognizerResult objects per input text, in the input order.
+        """
+        size = max(1, math.ceil(len(texts) / self.workers))
+        bounds = list(range(0, len(texts), size)) + [len(texts)]
+        shards = [
+            (texts[start:end], batch_size) for start, end in zip(bounds, bounds[1:])
+        ]
+        results = self._executor.map(_analyse, shards)
+        return [res for shard in results for res in shard]
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self._executor.shutdown()
@@ -14,6 +14,7 @@ setup(
     description="Project Description",
     packages=find_packages(),
     install_requires=requirements,
+    extras_require={"onnx": ["optimum[onnxruntime]"], "arrow": ["pyarrow"]},
     test_suite="tests",
     include_package_data=True,
     zip_safe=False,
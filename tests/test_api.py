@@ -0,0 +1,452 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import csv
+import os
+import tempfile
+import unittest
+import zipfile
+from xml.etree import ElementTree
+
+import openpyxl
+import pandas as pd
+
+from anonymization.api.anonym_api import Anonymizer
+from anonymization.api.anonym_api import anonymize_csv
+from anonymization.api.anonym_api import anonymize_dataframe
+from anonymization.api.anonym_api import anonymize_xlsx
+from anonymization.api.anonym_api import anonymize_xlsx_streaming
+from anonymization.api.arrow_io import anonymize_csv_arrow
+from anonymization.api.arrow_io import anonymize_feather
+from anonymization.api.arrow_io import anonymize_parquet
+from anonymization.api.journal import Journal
+from anonymization.api.shared_strings import anonymize_xlsx_shared_strings
+from anonymization.pii.config import gen_default_config
+
+# pyarrow is an optional dependency (arrow extra)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+DOC_RELS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+# Minimal workbook using a shared strings table (openpyxl writes inline strings)
+SHARED_XLSX = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/sharedStrings.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        f'<Relationships xmlns="{RELS}">'
+        f'<Relationship Id="rId1" Type="{DOC_RELS}/officeDocument" Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        f'<workbook xmlns="{MAIN}" xmlns:r="{DOC_RELS}">'
+        '<sheets><sheet name="data" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        f'<Relationships xmlns="{RELS}">'
+        f'<Relationship Id="rId1" Type="{DOC_RELS}/worksheet" Target="worksheets/sheet1.xml"/>'
+        f'<Relationship Id="rId2" Type="{DOC_RELS}/sharedStrings" Target="sharedStrings.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/sharedStrings.xml": (
+        f'<sst xmlns="{MAIN}" count="6" uniqueCount="3">'
+        "<si><t>Ecrire à jean@example.com</t></si>"
+        "<si><r><t>Rien </t></r><r><t>à signaler</t></r></si>"
+        "<si><t>marie@example.com</t></si>"
+        "</sst>"
+    ),
+    "xl/worksheets/sheet1.xml": (
+        f'<worksheet xmlns="{MAIN}"><sheetData>'
+        '<row r="1"><c r="A1"><v>1</v></c><c r="B1" t="s"><v>0</v></c></row>'
+        '<row r="2"><c r="A2"><v>2</v></c><c r="B2" t="s"><v>0</v></c>'
+        '<c r="C2" t="s"><v>2</v></c></row>'
+        '<row r="3"><c r="A3"><v>3</v></c><c r="B3" t="s"><v>1</v></c></row>'
+        '<row r="4"><c r="A4"><v>4</v></c><c r="B4" t="s"><v>2</v></c>'
+        '<c r="C4" t="inlineStr"><is><t>paul@example.com</t></is></c></row>'
+        '<row r="5"><c r="B5" t="inlineStr"><is><t>paul@example.com</t></is></c></row>'
+        "</sheetData></worksheet>"
+    ),
+}
+
+
+def pattern_config():
+    # Only the Presidio pattern recognizers, no model is loaded
+    config = gen_default_config()
+    config["use_camembert"] = False
+    config["use_swiss_ner"] = False
+    config["entities"] = ["EMAIL_ADDRESS"]
+    config["flag_only"] = False
+    config["process_columns"] = [1]
+    return config
+
+
+class TestApi(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.anonymizer = Anonymizer(pattern_config())
+        self.df = pd.DataFrame(
+            {
+                "id": list(range(7)),
+                "text": [f"Ecrire à user{i}@example.com svp" for i in range(7)],
+            }
+        )
+
+    def tearDown(self):
+        self.anonymizer.close()
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_factorize(self):
+        texts = ["Ecrire à jean@example.com", None, "Rien", "Ecrire à jean@example.com"]
+        df = pd.DataFrame({"id": [1, 2, None, 1], "text": texts})
+        expected = [self.anonymizer(value) for value in df["text"]]
+        expected_ids = [self.anonymizer(value) for value in df["id"]]
+
+        batches = []
+        anonymize_batch = self.anonymizer.anonymize_batch
+
+        def record(values):
+            batches.append(values)
+            return anonymize_batch(values)
+
+        self.anonymizer.anonymize_batch = record
+        anonymize_dataframe(df, self.anonymizer, [0, 1])
+        self.assertEqual(df["text"].tolist(), expected)
+        self.assertEqual(df["id"].tolist(), expected_ids)
+        self.assertEqual([len(batch) for batch in batches], [3, 3])
+
+    def test_workers(self):
+        texts = [f"Ecrire à user{i % 5}@example.com, merci" for i in range(20)]
+        config = pattern_config()
+        config["workers"] = 2
+        config["cache_size"] = 0
+        anonymizer = Anonymizer(config)
+        try:
+            results = anonymizer.detector.analyse_batch(texts)
+            self.assertIsNotNone(anonymizer.detector._pool)
+
+            # Single texts also go to the workers
+            def local(texts, batch_size):
+                raise AssertionError("analysed in the main process")
+
+            anonymizer.detector._analyse_batch = local
+            single = anonymizer.detector.analyse(texts[0])
+        finally:
+            anonymizer.close()
+        expected = self.anonymizer.detector.analyse_batch(texts)
+        self.assertEqual(
+            [[(r.entity_type, r.start, r.end) for r in res] for res in results],
+            [[(r.entity_type, r.start, r.end) for r in res] for res in expected],
+        )
+        self.assertEqual(
+            [(r.entity_type, r.start, r.end) for r in single],
+            [(r.entity_type, r.start, r.end) for r in expected[0]],
+        )
+
+    def test_csv_chunks(self):
+        self.df.to_csv(self.path("data.csv"), index=False)
+        anonymize_csv(
+            self.path("data.csv"), self.path("full.csv"), self.anonymizer, [1]
+        )
+        anonymize_csv(
+            self.path("data.csv"),
+            self.path("chunks.csv"),
+            self.anonymizer,
+            [1],
+            chunksize=3,
+        )
+        with open(self.path("full.csv")) as full, open(
+            self.path("chunks.csv")
+        ) as chunks:
+            self.assertEqual(full.read(), chunks.read())
+        out = pd.read_csv(self.path("chunks.csv"))
+        self.assertEqual(out["id"].tolist(), self.df["id"].tolist())
+        self.assertTrue(all("example.com" not in text for text in out["text"]))
+
+    def test_csv_chunks_types(self):
+        # Missing value in the second chunk of a column of integers
+        lines = [
+            "id,score,text",
+            "1,10,Ecrire à jean@example.com",
+            "2,20,",
+            "3,,Ecrire à paul@example.com",
+            "4,40.5,Merci",
+        ]
+        with open(self.path("data.csv"), "w") as file:
+            file.write("\n".join(lines) + "\n")
+        for chunksize in [None, 2]:
+            anonymize_csv(
+                self.path("data.csv"),
+                self.path("out.csv"),
+                self.anonymizer,
+                [2],
+                chunksize=chunksize,
+            )
+            with open(self.path("out.csv"), newline="") as file:
+                rows = list(csv.reader(file))
+            self.assertEqual(
+                [row[:2] for row in rows], [line.split(",")[:2] for line in lines]
+            )
+            self.assertEqual(rows[2][2], "")
+            self.assertEqual(rows[3][2].strip(), "Ecrire à <ANONYM_EMAIL>")
+
+    def arrow_table(self):
+        texts = self.df["text"].tolist()
+        texts[2] = None
+        texts[3] = texts[0]
+        return pa.table({"id": self.df["id"].tolist(), "text": texts})
+
+    def check_arrow(self, table):
+        self.assertEqual(table.column_names, ["id", "text"])
+        self.assertEqual(table.schema.field("text").type, pa.string())
+        self.assertEqual(table.column("id").to_pylist(), self.df["id"].tolist())
+        texts = table.column("text").to_pylist()
+        self.assertIsNone(texts[2])
+        self.assertEqual(texts[0], texts[3])
+        self.assertTrue(all("example.com" not in text for text in texts if text))
+
+    @unittest.skipUnless(pa, "requires pyarrow")
+    def test_parquet(self):
+        pq.write_table(self.arrow_table(), self.path("data.parquet"), row_group_size=3)
+        anonymize_parquet(
+            self.path("data.parquet"), self.path("out.parquet"), self.anonymizer, [1]
+        )
+        self.assertEqual(pq.ParquetFile(self.path("out.parquet")).num_row_groups, 3)
+        self.check_arrow(pq.read_table(self.path("out.parquet")))
+
+    @unittest.skipUnless(pa, "requires pyarrow")
+    def test_feather(self):
+        table = self.arrow_table()
+        with pa.ipc.new_file(self.path("data.feather"), table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=3):
+                writer.write_batch(batch)
+        anonymize_feather(
+            self.path("data.feather"), self.path("out.feather"), self.anonymizer, [1]
+        )
+        with pa.memory_map(self.path("out.feather")) as source:
+            self.check_arrow(pa.ipc.open_file(source).read_all())
+
+    @unittest.skipUnless(pa, "requires pyarrow")
+    def test_csv_arrow(self):
+        self.df.to_csv(self.path("data.csv"), index=False)
+        anonymize_csv_arrow(
+            self.path("data.csv"),
+            self.path("arrow.csv"),
+            self.anonymizer,
+            [1],
+            block_size=100,
+        )
+        anonymize_csv(
+            self.path("data.csv"), self.path("pandas.csv"), self.anonymizer, [1]
+        )
+        self.assertTrue(
+            pd.read_csv(self.path("arrow.csv")).equals(
+                pd.read_csv(self.path("pandas.csv"))
+            )
+        )
+
+    @unittest.skipUnless(pa, "requires pyarrow")
+    def test_csv_arrow_resume(self):
+        with open(self.path("big.csv"), "w") as file:
+            file.write("id,text\n")
+            for i in range(200):
+                file.write(f"{i},Ecrire à user{i}@example.com\n")
+        anonymize_csv_arrow(
+            self.path("big.csv"),
+            self.path("full.csv"),
+            self.anonymizer,
+            [1],
+            block_size=1000,
+        )
+
+        # Interrupted during the third block
+        anonymize_batch = self.anonymizer.anonymize_batch
+        calls = []
+
+        def interrupt(values):
+            calls.append(values)
+            if len(calls) == 3:
+                raise KeyboardInterrupt()
+            return anonymize_batch(values)
+
+        self.anonymizer.anonymize_batch = interrupt
+        journal = Journal(self.path("out.csv"))
+        journal.start()
+        with self.assertRaises(KeyboardInterrupt):
+            anonymize_csv_arrow(
+                self.path("big.csv"),
+                self.path("out.csv"),
+                self.anonymizer,
+                [1],
+                block_size=1000,
+                journal=journal,
+            )
+        self.assertGreater(journal.last()["rows"], 0)
+        # Partial write after the last checkpoint
+        with open(self.path("out.csv"), "a") as file:
+            file.write('"150","partial')
+
+        self.anonymizer.anonymize_batch = anonymize_batch
+        anonymize_csv_arrow(
+            self.path("big.csv"),
+            self.path("out.csv"),
+            self.anonymizer,
+            [1],
+            block_size=1000,
+            journal=journal,
+            resume=True,
+        )
+        with open(self.path("out.csv")) as out, open(self.path("full.csv")) as full:
+            self.assertEqual(out.read(), full.read())
+
+    def write_xlsx(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.title = "first"
+        for row in self.df.itertuples(index=False):
+            sheet.append(list(row))
+        sheet["D9"] = "contact@example.com"
+        workbook.create_sheet("empty")
+        workbook.save(self.path("data.xlsx"))
+
+    def read_xlsx(self, name):
+        workbook = openpyxl.load_workbook(self.path(name))
+        return {
+            sheet.title: list(sheet.iter_rows(values_only=True))
+            for sheet in workbook.worksheets
+        }
+
+    def test_xlsx_streaming(self):
+        self.write_xlsx()
+        anonymize_xlsx(
+            self.path("data.xlsx"), self.path("full.xlsx"), self.anonymizer, [2]
+        )
+        anonymize_xlsx_streaming(
+            self.path("data.xlsx"),
+            self.path("stream.xlsx"),
+            self.anonymizer,
+            [2],
+            chunksize=3,
+        )
+        full = self.read_xlsx("full.xlsx")
+        self.assertEqual(full, self.read_xlsx("stream.xlsx"))
+        self.assertEqual(list(full), ["first", "empty"])
+        self.assertEqual(full["first"][0][0], 0)
+        self.assertNotIn("example.com", full["first"][0][1])
+        self.assertEqual(full["first"][8][3], "contact@example.com")
+
+    def test_xlsx_shared_strings(self):
+        with zipfile.ZipFile(self.path("data.xlsx"), "w") as archive:
+            for name, data in SHARED_XLSX.items():
+                archive.writestr(name, data)
+
+        batches = []
+        anonymize_batch = self.anonymizer.anonymize_batch
+
+        def record(values):
+            batches.append(values)
+            return anonymize_batch(values)
+
+        self.anonymizer.anonymize_batch = record
+        anonymize_xlsx_shared_strings(
+            self.path("data.xlsx"), self.path("shared.xlsx"), self.anonymizer, [2]
+        )
+        # Each distinct text of the processed column is analysed once
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 4)
+
+        rows = self.read_xlsx("shared.xlsx")["data"]
+        self.assertEqual([row[0] for row in rows], [1, 2, 3, 4, None])
+        self.assertEqual(rows[0][1], rows[1][1])
+        self.assertTrue(rows[0][1].startswith("Ecrire à "))
+        self.assertEqual(rows[2][1], "Rien à signaler")
+        self.assertNotIn("example.com", rows[3][1])
+        self.assertNotIn("example.com", rows[4][1])
+        # The other columns are not changed
+        self.assertEqual(rows[1][2], "marie@example.com")
+        self.assertEqual(rows[3][2], "paul@example.com")
+        with zipfile.ZipFile(self.path("shared.xlsx")) as archive:
+            table = archive.read("xl/sharedStrings.xml").decode("utf-8")
+        self.assertNotIn("jean@example.com", table)
+        self.assertIn('uniqueCount="4"', table)
+
+    def test_xlsx_shared_strings_prefix(self):
+        # Namespace prefixed tags and cells without reference
+        files = dict(SHARED_XLSX)
+        files["xl/worksheets/sheet1.xml"] = (
+            f'<x:worksheet xmlns:x="{MAIN}"><x:sheetData>'
+            '<x:row r="1"><x:c><x:v>1</x:v></x:c><x:c t="s"><x:v>0</x:v></x:c>'
+            '<x:c t="s"><x:v>2</x:v></x:c></x:row>'
+            '<x:row><x:c r="A2"><x:v>2</x:v></x:c>'
+            '<x:c t="inlineStr"><x:is><x:t>paul@example.com</x:t></x:is></x:c></x:row>'
+            "</x:sheetData></x:worksheet>"
+        )
+        with zipfile.ZipFile(self.path("data.xlsx"), "w") as archive:
+            for name, data in files.items():
+                archive.writestr(name, data)
+        anonymize_xlsx_shared_strings(
+            self.path("data.xlsx"), self.path("shared.xlsx"), self.anonymizer, [2]
+        )
+        with zipfile.ZipFile(self.path("shared.xlsx")) as archive:
+            table = archive.read("xl/sharedStrings.xml").decode("utf-8")
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        ElementTree.fromstring(sheet)
+        self.assertNotIn("jean@example.com", table)
+        self.assertIn("marie@example.com", table)
+        self.assertNotIn("paul@example.com", sheet)
+        self.assertIn("<x:is><x:t", sheet)
+
+    def test_xlsx_shared_strings_formula(self):
+        # The cached result of a formula may hold the text it builds
+        files = dict(SHARED_XLSX)
+        files["xl/worksheets/sheet1.xml"] = (
+            f'<worksheet xmlns="{MAIN}"><sheetData>'
+            '<row r="1"><c r="B1" t="str"><f>"jean.dupont@"&amp;"bcv.ch"</f>'
+            "<v>jean.dupont@bcv.ch</v></c>"
+            '<c r="C1" t="str"><f>"marie@"&amp;"bcv.ch"</f><v>marie@bcv.ch</v></c>'
+            "</row></sheetData></worksheet>"
+        )
+        with zipfile.ZipFile(self.path("data.xlsx"), "w") as archive:
+            for name, data in files.items():
+                archive.writestr(name, data)
+        anonymize_xlsx_shared_strings(
+            self.path("data.xlsx"), self.path("shared.xlsx"), self.anonymizer, [2]
+        )
+        with zipfile.ZipFile(self.path("shared.xlsx")) as archive:
+            sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+            workbook = archive.read("xl/workbook.xml").decode("utf-8")
+        self.assertNotIn("<v>jean.dupont@bcv.ch</v>", sheet)
+        self.assertIn("<f>", sheet)
+        # The other columns are not changed
+        self.assertIn("<v>marie@bcv.ch</v>", sheet)
+        self.assertIn('<calcPr fullCalcOnLoad="1"/>', workbook)
+        rows = self.read_xlsx("shared.xlsx")["data"]
+        self.assertTrue(rows[0][1].startswith("="))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import os
+import tempfile
+import unittest
+
+from anonymization.api.anonym_api import Anonymizer
+from anonymization.api.anonym_api import anonymize_csv
+from anonymization.api.batch import anonymize_files
+from anonymization.api.batch import expand_inputs
+from anonymization.api.batch import read_manifest
+from anonymization.api.journal import Journal
+from tests.test_api import pattern_config
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.files = {
+            "a.csv": "id,text\n1,Ecrire à jean@example.com\n",
+            "sub/b.txt": "Contact: paul@example.com\n",
+            "sub/b_anonymized.txt": "Contact: <ANONYM_EMAIL>\n",
+            "notes.doc": "jean@example.com",
+        }
+        for name, content in self.files.items():
+            os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+            with open(self.path(name), "w") as file:
+                file.write(content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_expand_inputs(self):
+        files = expand_inputs([self.tmp.name, self.path("*.csv")])
+        self.assertEqual(
+            files,
+            [(self.path("a.csv"), "a.csv"), (self.path("sub/b.txt"), "sub/b.txt")],
+        )
+
+        with open(self.path("manifest.txt"), "w") as file:
+            file.write("# inputs\nsub/b.txt\n\na.csv\n")
+        self.assertEqual(
+            read_manifest(self.path("manifest.txt")),
+            [self.path("sub/b.txt"), self.path("a.csv")],
+        )
+
+    def test_anonymize_files(self):
+        report = anonymize_files(
+            [self.tmp.name, self.path("missing.csv")],
+            pattern_config(),
+            output_dir=self.path("out"),
+        )
+        self.assertEqual(
+            [(item["output"], item["status"]) for item in report[:2]],
+            [
+                (self.path("out/a_anonymized.csv"), "ok"),
+                (self.path("out/sub/b_anonymized.txt"), "ok"),
+            ],
+        )
+        self.assertTrue(report[2]["status"].startswith("FileNotFoundError"))
+        with open(self.path("out/sub/b_anonymized.txt")) as file:
+            self.assertEqual(file.read().strip(), "Contact: <ANONYM_EMAIL>")
+
+    def test_duplicate_outputs(self):
+        os.makedirs(self.path("other"))
+        with open(self.path("other/a.csv"), "w") as file:
+            file.write(self.files["a.csv"])
+        self.assertEqual(
+            expand_inputs([self.path("**/b.txt")]),
+            [(self.path("sub/b.txt"), os.path.join("sub", "b.txt"))],
+        )
+        report = anonymize_files(
+            [self.path("*.csv"), self.path("other/*.csv")],
+            pattern_config(),
+            output_dir=self.path("out"),
+        )
+        self.assertEqual(
+            [item["status"] for item in report],
+            ["ok", f"Duplicate output: same output as {self.path('a.csv')}"],
+        )
+
+    def test_resume(self):
+        with open(self.path("big.csv"), "w") as file:
+            file.write("id,text\n")
+            for i in range(11):
+                file.write(f"{i},Ecrire à user{i}@example.com\n")
+        anonymizer = Anonymizer(pattern_config())
+        anonymize_csv(
+            self.path("big.csv"), self.path("full.csv"), anonymizer, [1], chunksize=3
+        )
+
+        # Interrupted during the third chunk
+        anonymize_batch = anonymizer.anonymize_batch
+        calls = []
+
+        def interrupt(values):
+            calls.append(values)
+            if len(calls) == 3:
+                raise KeyboardInterrupt()
+            return anonymize_batch(values)
+
+        anonymizer.anonymize_batch = interrupt
+        journal = Journal(self.path("out.csv"))
+        journal.start()
+        with self.assertRaises(KeyboardInterrupt):
+            anonymize_csv(
+                self.path("big.csv"),
+                self.path("out.csv"),
+                anonymizer,
+                [1],
+                chunksize=3,
+                journal=journal,
+            )
+        self.assertEqual(journal.last()["rows"], 6)
+        # Partial write after the last checkpoint
+        with open(self.path("out.csv"), "a") as file:
+            file.write("6,partial")
+
+        anonymizer.anonymize_batch = anonymize_batch
+        anonymize_csv(
+            self.path("big.csv"),
+            self.path("out.csv"),
+            anonymizer,
+            [1],
+            chunksize=4,
+            journal=journal,
+            resume=True,
+        )
+        anonymizer.close()
+        with open(self.path("full.csv")) as full, open(self.path("out.csv")) as out:
+            self.assertEqual(full.read(), out.read())
+        self.assertEqual(journal.last()["rows"], 11)
+
+        # Complete outputs are skipped
+        inputs = [self.path("big.csv"), self.path("a.csv")]
+        report = anonymize_files(inputs, pattern_config(), resume=True)
+        self.assertEqual([item["status"] for item in report], ["ok", "ok"])
+        self.assertFalse(Journal(report[0]["output"]).exists())
+        report = anonymize_files(inputs, pattern_config(), resume=True)
+        self.assertEqual([item["status"] for item in report], ["skipped", "skipped"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import os
+import tempfile
+import unittest
+
+from presidio_analyzer import RecognizerResult
+
+from anonymization.pii.cache import AnalysisCache
+from anonymization.pii.cache import config_fingerprint
+from anonymization.pii.config import gen_default_config
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.results = [RecognizerResult("PERSON", 0, 11, 0.9, "camembert")]
+
+    def test_lru(self):
+        cache = AnalysisCache("config", max_size=2)
+        self.assertIsNone(cache.get("Jean Dupont"))
+        cache.put("Jean Dupont", self.results)
+        cache.put("Marie Curie", [])
+        self.assertEqual(
+            cache.get("Jean Dupont")[0].to_dict(), self.results[0].to_dict()
+        )
+        cache.put("Pierre Curie", [])
+        self.assertIsNone(cache.get("Marie Curie"))
+        self.assertEqual(cache.get("Pierre Curie"), [])
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "size": 2})
+
+    def test_fingerprint(self):
+        config = gen_default_config()
+        fingerprint = config_fingerprint(config)
+        config["pseudonymize"] = ["PERSON"]
+        self.assertEqual(config_fingerprint(config), fingerprint)
+        config["entities"] = ["PERSON"]
+        self.assertNotEqual(config_fingerprint(config), fingerprint)
+        self.assertNotEqual(
+            AnalysisCache("a").key("Jean Dupont"), AnalysisCache("b").key("Jean Dupont")
+        )
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            cache = AnalysisCache("config", path=path)
+            cache.put("Jean Dupont", self.results)
+            cache.close()
+
+            cache = AnalysisCache("config", path=path)
+            results = cache.get("Jean Dupont")
+            self.assertEqual(results[0].to_dict(), self.results[0].to_dict())
+            self.assertEqual(cache.stats()["hits"], 1)
+            cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
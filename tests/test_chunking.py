@@ -0,0 +1,61 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import unittest
+
+from presidio_analyzer import RecognizerResult
+
+from anonymization.pii.chunking import chunk_text
+from anonymization.pii.chunking import merge_chunk_results
+from anonymization.pii.chunking import split_sentences
+
+
+class TestChunking(unittest.TestCase):
+    def test_split_sentences(self):
+        text = "Bonjour M. Dupont. Il habite à Sion.\nSon numéro est 0763252698."
+        spans = split_sentences(text)
+        self.assertEqual("".join(text[s:e] for s, e in spans), text)
+        self.assertEqual(text[slice(*spans[-1])], "Son numéro est 0763252698.")
+
+    def test_chunk_text(self):
+        text = " ".join(f"Phrase numéro {i} pour Jean Dupont." for i in range(100))
+        chunks = chunk_text(text, chunk_size=20, overlap=6)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(text))
+        for (start, end), (next_start, _) in zip(chunks, chunks[1:]):
+            self.assertLess(next_start, end)
+            self.assertGreater(next_start, start)
+        for start, end in chunks:
+            self.assertLessEqual(len(text[start:end].split()), 20)
+
+    def test_chunk_long_sentence(self):
+        text = " ".join(["mot"] * 50)
+        chunks = chunk_text(text, chunk_size=10, overlap=0)
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual("".join(text[s:e] for s, e in chunks), text)
+
+    def test_merge(self):
+        text = "Jean Dupont habite à Sion. Marie Curie habite à Sion."
+        chunks = [(0, 40), (27, len(text))]
+
+        def res(start, end):
+            return RecognizerResult("PERSON", start, end, 0.9, "camembert")
+
+        results = [
+            [res(0, 11), res(27, 38), res(27, 40)],
+            [res(0, 11)],
+        ]
+        merged = merge_chunk_results(chunks, results, len(text))
+        self.assertEqual([(r.start, r.end) for r in merged], [(0, 11), (27, 38)])
+
+
+if __name__ == "__main__":
+    unittest.main()
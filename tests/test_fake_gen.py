@@ -0,0 +1,164 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import subprocess  # nosec
+import sys
+import threading
+import unittest
+
+from faker import Faker
+from faker.providers.person import fr_CH as person
+
+from anonymization.pii.anonym_ops import gen_operators
+from anonymization.pii.config import gen_default_config
+from anonymization.pii.fake_gen import deduce_gender
+from anonymization.pii.fake_gen import fake_email
+from anonymization.pii.fake_gen import fake_id
+from anonymization.pii.fake_gen import fake_name
+from anonymization.pii.fake_gen import fake_swiss_zip_code
+from anonymization.pii.fake_gen import fake_url
+from anonymization.pii.fake_gen import get_faker
+from anonymization.pii.fake_gen import get_gender_detector
+from anonymization.pii.fake_gen import get_pseudonym_store
+from anonymization.pii.fake_gen import reset_mem_fake
+from anonymization.pii.fake_gen import seed_fakers
+from anonymization.pii.fake_gen import set_pseudonym_pool
+from anonymization.pii.pseudonym_pool import PseudonymPool
+from anonymization.pii.pseudonym_pool import generate
+
+
+class TestFakeGen(unittest.TestCase):
+    def setUp(self):
+        reset_mem_fake()
+        seed_fakers(None)
+
+    def tearDown(self):
+        reset_mem_fake()
+        seed_fakers(None)
+
+    def test_reuse(self):
+        self.assertIs(get_faker(), get_faker())
+        self.assertIsNot(get_faker(), get_faker("en_US"))
+        fakers = []
+        thread = threading.Thread(target=lambda: fakers.append(get_faker()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(fakers[0], get_faker())
+
+    def test_seed(self):
+        seed_fakers(42)
+        first = [fake_email(f"user{i}@example.com") for i in range(3)]
+        reset_mem_fake()
+        seed_fakers(42)
+        second = [fake_email(f"user{i}@example.com") for i in range(3)]
+        self.assertEqual(first, second)
+
+    def test_memory(self):
+        self.assertEqual(fake_email("jean@example.com"), fake_email("jean@example.com"))
+        self.assertEqual(fake_url("www.example.com"), fake_url("www.example.com"))
+        zip_code = fake_swiss_zip_code("1920")
+        self.assertEqual(zip_code, fake_swiss_zip_code("1920"))
+        self.assertTrue(zip_code.startswith(", "))
+
+    def test_gender(self):
+        self.assertIs(get_gender_detector(), get_gender_detector())
+        self.assertEqual(deduce_gender("Pierre"), "male")
+        self.assertEqual(deduce_gender("Marie"), "female")
+        self.assertIsNone(deduce_gender("Xyzzy"))
+        hits = deduce_gender.cache_info().hits
+        deduce_gender("Pierre")
+        self.assertEqual(deduce_gender.cache_info().hits, hits + 1)
+
+    def test_keyed(self):
+        name = fake_name("Jean Dupont", key="secret")
+        self.assertEqual(fake_name("JEAN DUPONT", key="secret"), name)
+        self.assertEqual(len(get_pseudonym_store()), 0)
+        self.assertEqual(
+            fake_id("123456", key="secret"), fake_id("123456", key="secret")
+        )
+        self.assertNotEqual(
+            fake_id("123456", key="secret"), fake_id("654321", key="secret")
+        )
+
+        # Same pseudonym in another process
+        code = (
+            "from anonymization.pii.fake_gen import fake_name;"
+            "print(fake_name('Jean Dupont', key='secret'), end='')"
+        )
+        out = subprocess.run(  # nosec
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(out.stdout, name)
+
+        self.assertNotEqual(fake_name("Jean Dupont", key="other"), name)
+
+    def test_keyed_operators(self):
+        # The key of an operator set is not changed by the ones created later
+        config = gen_default_config()
+        config["flag_only"] = False
+        config["pseudonymize"] = ["PERSON"]
+        config["pseudonym_key"] = "secret"
+        keyed = gen_operators(config)["PERSON"].params["lambda"]
+        config["pseudonym_key"] = None
+        random = gen_operators(config)["PERSON"].params["lambda"]
+        name = fake_name("Jean Dupont", key="secret")
+        self.assertEqual(keyed("Jean Dupont"), name)
+        self.assertEqual(random("Paul Martin"), random("Paul Martin"))
+        self.assertEqual(keyed("Jean Dupont"), name)
+        # The operators use their own store
+        self.assertEqual(len(get_pseudonym_store()), 0)
+
+    def test_pool(self):
+        pool = PseudonymPool(size=8)
+        cities = [pool.draw("city", get_faker()) for _ in range(20)]
+        self.assertTrue(all(isinstance(city, str) and city for city in cities))
+        pool.close()
+
+        seed_fakers(7)
+        set_pseudonym_pool(16)
+        first = [fake_name("Pierre") for _ in range(3)] + [fake_email("a@b.ch")]
+        reset_mem_fake()
+        seed_fakers(7)
+        second = [fake_name("Pierre") for _ in range(3)] + [fake_email("a@b.ch")]
+        self.assertEqual(first, second)
+        set_pseudonym_pool(0)
+
+    def test_generate(self):
+        fake = Faker("fr_CH")
+        fake.seed_instance(1)
+        first_names = set(person.Provider.first_names_male)
+        last_names = set(person.Provider.last_names)
+        for name in generate(fake, "name_male", 200):
+            first, last = name.split(" ")
+            self.assertIn(first, first_names)
+            # A last name, or two joined by a hyphen
+            self.assertTrue(
+                last in last_names
+                or any(
+                    last.startswith(f"{n}-")
+                    and last[len(n) + 1 :] in last_names  # noqa: E203
+                    for n in last_names
+                ),
+                last,
+            )
+        postcodes = generate(fake, "postcode", 200)
+        self.assertTrue(all(len(p) == 4 and p.isdigit() for p in postcodes))
+        self.assertTrue(all(generate(fake, "city", 200)))
+        self.assertEqual(len(generate(fake, "iban", 5)), 5)
+
+        # Reproducible with a seeded generator
+        fake.seed_instance(2)
+        names = generate(fake, "name", 50)
+        fake.seed_instance(2)
+        self.assertEqual(generate(fake, "name", 50), names)
+
+        # Methods replaced by the provider of the locale are called for each value
+        fake = Faker("en_US")
+        self.assertTrue(all(len(p) == 5 for p in generate(fake, "postcode", 200)))
@@ -0,0 +1,97 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import unittest
+
+from presidio_analyzer import RecognizerResult
+
+from anonymization.pii.config import gen_default_config
+from anonymization.pii.merge import group_overlaps
+from anonymization.pii.merge import merge_results
+from anonymization.pii.planner import load_pattern_registry
+from anonymization.pii.planner import plan_detectors
+
+
+def spans(results):
+    return [(r.entity_type, r.start, r.end) for r in results]
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        # "Banque Cantonale du Valais, Jean Dupont"
+        self.results = [
+            RecognizerResult("ORGANIZATION", 0, 26, 0.8, "camembert"),
+            RecognizerResult("LOCATION", 20, 26, 0.9, "swiss_ner"),
+            RecognizerResult("ORGANIZATION", 0, 16, 0.7, "swiss_ner"),
+            RecognizerResult("PERSON", 28, 39, 0.95, "camembert"),
+            RecognizerResult("PERSON", 28, 39, 0.85, "swiss_ner"),
+            RecognizerResult("PERSON", 33, 39, 0.85, None),
+        ]
+
+    def test_group_overlaps(self):
+        groups = group_overlaps(self.results)
+        self.assertEqual([len(group) for group in groups], [3, 3])
+
+    def test_union(self):
+        merged = merge_results(self.results, policy="union")
+        self.assertEqual(spans(merged), [("ORGANIZATION", 0, 26), ("PERSON", 28, 39)])
+        self.assertEqual(merged[0].score, 0.8)
+
+    def test_max_score(self):
+        merged = merge_results(self.results, policy="max_score")
+        self.assertEqual(spans(merged), [("LOCATION", 20, 26), ("PERSON", 28, 39)])
+        self.assertEqual(merged[1].score, 0.95)
+
+    def test_priority(self):
+        merged = merge_results(
+            self.results, policy="priority", priorities=["PERSON", "ORGANIZATION"]
+        )
+        self.assertEqual(spans(merged), [("ORGANIZATION", 0, 26), ("PERSON", 28, 39)])
+
+    def test_majority(self):
+        merged = merge_results(self.results, policy="majority", n_detectors=3)
+        self.assertEqual(spans(merged), [("ORGANIZATION", 0, 26), ("PERSON", 28, 39)])
+        merged = merge_results(
+            self.results[:3],
+            policy="majority",
+            entity_detectors={"ORGANIZATION": 5, "LOCATION": 5},
+        )
+        self.assertEqual(merged, [])
+
+    def test_majority_single_detector(self):
+        # Only Presidio finds email addresses
+        results = [
+            RecognizerResult("EMAIL_ADDRESS", 0, 16, 1.0, None),
+            RecognizerResult("PERSON", 20, 31, 0.9, "camembert"),
+            RecognizerResult("PERSON", 20, 31, 0.8, "swiss_ner"),
+        ]
+        plan = plan_detectors(gen_default_config(), load_pattern_registry("fr"))
+        for entity_detectors in [None, plan["entity_detectors"]]:
+            merged = merge_results(
+                results,
+                policy="majority",
+                n_detectors=3,
+                entity_detectors=entity_detectors,
+            )
+            self.assertEqual(
+                spans(merged), [("EMAIL_ADDRESS", 0, 16), ("PERSON", 20, 31)]
+            )
+
+    def test_deterministic(self):
+        for policy in ["union", "majority", "max_score", "priority"]:
+            merged = merge_results(self.results, policy=policy)
+            reverse = merge_results(self.results[::-1], policy=policy)
+            self.assertEqual(spans(merged), spans(reverse))
+            for a, b in zip(merged, merged[1:]):
+                self.assertLessEqual(a.end, b.start)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,6 +12,10 @@ import unittest
 
 from transformers import pipeline
 
+from anonymization.pii.onnx_backend import load_onnx_pipeline
+from anonymization.pii.onnx_backend import ner_parity
+from anonymization.pii.pii import load_swiss_ner
+
 
 class TestAttention(unittest.TestCase):
     def test_ner(self):
@@ -61,6 +65,34 @@ class TestAttention(unittest.TestCase):
         results = token_classifier("J'habite à Lausanne.")
         print(results)
 
+    def test_onnx_parity(self):
+        model = "Jean-Baptiste/camembert-ner-with-dates"
+        texts = [
+            "Quentin Jerome Tarantino naît le 27 mars 1963 à Knoxville.",
+            "Il est le fils de Connie McHugh, une infirmière.",
+            "En 1965, sa mère déménage à Torrance, dans la banlieue de Los Angeles.",
+        ]
+        ner = pipeline(
+            task="ner", model=model, tokenizer=model, aggregation_strategy="simple"
+        )
+        onnx_ner = load_onnx_pipeline(model)
+        parity = ner_parity(ner(texts), onnx_ner(texts))
+        print(parity)
+        self.assertGreaterEqual(parity["f1"], 0.9)
+
+    def test_swiss_ner_quantized_parity(self):
+        # SwissBERT is quantized with PyTorch under the "onnx" backend
+        texts = [
+            "Jean Dupont habite à Sion et travaille à la Banque Cantonale du Valais.",
+            "Marie Favre a rencontré le conseiller fédéral Alain Berset à Berne.",
+            "L'EPFL et l'Université de Genève ouvrent un laboratoire à Lausanne.",
+        ]
+        ner = load_swiss_ner("fr")
+        quantized_ner = load_swiss_ner("fr", backend="onnx")
+        parity = ner_parity(ner(texts), quantized_ner(texts))
+        print(parity)
+        self.assertGreaterEqual(parity["f1"], 0.9)
+
 
 if __name__ == "__main__":
     unittest.main()
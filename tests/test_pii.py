@@ -58,6 +58,37 @@ class TestAttention(unittest.TestCase):
         final = anonym.anonymise(text, results)
         print(final)
 
+    def test_batch(self):
+        texts = [
+            "Quentin Jerome Tarantino naît le 27 mars 1963 à Knoxville.",
+            "Son compte bancaire CH756625551233 chez UBS.",
+            "Vous pouvez le contacter à cette adresse b.azur@youpi.com.",
+        ]
+        # Without cache, so that each text is analysed again on its own
+        config = gen_default_config()
+        config["cache_size"] = 0
+        detector = PIIDetection(config)
+        self.assertIsNone(detector.cache)
+        results = detector.analyse_batch(texts, batch_size=2)
+        self.assertEqual(len(results), len(texts))
+        for text, res in zip(texts, results):
+            expected = detector.analyse(text)
+            self.assertEqual(
+                [(r.entity_type, r.start, r.end) for r in res],
+                [(r.entity_type, r.start, r.end) for r in expected],
+            )
+
+    def test_concurrent(self):
+        text = "Quentin Jerome Tarantino naît le 27 mars 1963 à Knoxville."
+        config = gen_default_config()
+        results = PIIDetection(config).analyse(text)
+        config["concurrent"] = True
+        concurrent_results = PIIDetection(config).analyse(text)
+        self.assertEqual(
+            [(r.entity_type, r.start, r.end) for r in results],
+            [(r.entity_type, r.start, r.end) for r in concurrent_results],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
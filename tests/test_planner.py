@@ -0,0 +1,72 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import unittest
+
+from anonymization.pii import PIIDetection
+from anonymization.pii import registry
+from anonymization.pii.config import gen_default_config
+from anonymization.pii.planner import load_pattern_registry
+from anonymization.pii.planner import plan_detectors
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.registry = load_pattern_registry("fr")
+
+    def test_default(self):
+        plan = plan_detectors(gen_default_config(), self.registry)
+        self.assertTrue(plan["camembert"])
+        self.assertTrue(plan["swiss_ner"])
+        self.assertTrue(plan["spacy"])
+        self.assertFalse(plan["patterns"])
+        self.assertNotIn("MISC", plan["presidio_entities"])
+        self.assertEqual(plan["entity_detectors"]["PERSON"], 3)
+        self.assertEqual(plan["entity_detectors"]["EMAIL_ADDRESS"], 1)
+
+    def test_narrow(self):
+        config = gen_default_config()
+        config["entities"] = ["BANK_ACCOUNT", "CH_ZIPCODE"]
+        plan = plan_detectors(config, self.registry)
+        self.assertFalse(plan["camembert"])
+        self.assertFalse(plan["swiss_ner"])
+        self.assertFalse(plan["spacy"])
+        self.assertTrue(plan["patterns"])
+        self.assertEqual(plan["presidio_entities"], ["BANK_ACCOUNT", "CH_ZIPCODE"])
+
+        detector = PIIDetection(config)
+        results = detector.analyse("Son compte CH756625551233 chez UBS, 1950, Sion.")
+        self.assertEqual(
+            sorted(r.entity_type for r in results), ["BANK_ACCOUNT", "CH_ZIPCODE"]
+        )
+        self.assertEqual(registry.loaded_models(), dict())
+
+    def test_misc_only(self):
+        config = gen_default_config()
+        config["entities"] = ["MISC"]
+        config["use_camembert"] = False
+        plan = plan_detectors(config, self.registry)
+        self.assertTrue(plan["swiss_ner"])
+        self.assertFalse(plan["spacy"])
+        self.assertFalse(plan["patterns"])
+
+    def test_backend_model_names(self):
+        config = gen_default_config()
+        config["ner_backend"] = "onnx"
+        detector = PIIDetection(config)
+        self.assertEqual(
+            detector.camembert_model, "Jean-Baptiste/camembert-ner-with-dates:onnx"
+        )
+        # SwissBERT is quantized with PyTorch, not exported to ONNX
+        self.assertEqual(detector.swiss_ner_model, "ZurichNLP/swissbert-ner:int8")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import unittest
+from datetime import datetime
+
+from anonymization.pii.config import gen_default_config
+from anonymization.pii.prescreen import PreScreen
+
+
+class TestPreScreen(unittest.TestCase):
+    def test_skip(self):
+        prescreen = PreScreen(gen_default_config())
+        skipped = [
+            None,
+            float("nan"),
+            True,
+            datetime(2023, 1, 31),
+            12.5,
+            1250,
+            "A",
+            "1'250.50",
+            "-3 000,00 CHF",
+            "CHF 12.-",
+            "12 %",
+            "2023-01-31",
+            "2023-01-31T12:00:00Z",
+            "--- / ---",
+        ]
+        analysed = [
+            "Jean Dupont",
+            "0763252698",
+            "079 563 68 84",
+            "CH756625551233",
+            "b.azur@youpi.com",
+            "Virement de 30 CHF à M. Japser",
+            "1234",
+            763252698,
+        ]
+        for value in skipped:
+            self.assertTrue(prescreen.skip(value), value)
+        for value in analysed:
+            self.assertFalse(prescreen.skip(value), value)
+        self.assertEqual(
+            prescreen.stats(),
+            {"checked": len(skipped) + len(analysed), "skipped": len(skipped)},
+        )
+
+    def test_phone_numbers(self):
+        # Phone numbers look like amounts with space separators, they must be analysed
+        prescreen = PreScreen(gen_default_config())
+        phones = [
+            "079 563 684",
+            "+41 791 234 567",
+            "021 234 567",
+            "+41 21 234 56 78",
+            "0041 79 123 45 67",
+            "079 563 68 84",
+            "079'563'684",
+        ]
+        for value in phones:
+            self.assertFalse(prescreen.skip(value), value)
+
+    def test_config(self):
+        config = gen_default_config()
+        config["prescreen_patterns"] = [r"REF-\d+"]
+        prescreen = PreScreen(config)
+        self.assertTrue(prescreen.skip("REF-1234"))
+        self.assertFalse(prescreen.skip("2023-01-31"))
+        config["prescreen"] = False
+        self.assertFalse(PreScreen(config).skip("A"))
+
+
+if __name__ == "__main__":
+    unittest.main()
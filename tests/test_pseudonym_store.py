@@ -0,0 +1,83 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import os
+import tempfile
+import unittest
+
+from anonymization.pii.anonym_ops import gen_operators
+from anonymization.pii.config import gen_default_config
+from anonymization.pii.fake_gen import get_pseudonym_store
+from anonymization.pii.pseudonym_store import PseudonymStore
+from anonymization.pii.pseudonym_store import SQLitePseudonymStore
+from anonymization.pii.pseudonym_store import make_pseudonym_store
+
+
+class TestPseudonymStore(unittest.TestCase):
+    def test_memory(self):
+        store = PseudonymStore(max_size=2)
+        self.assertIsNone(store.get("jean", "PERSON"))
+        self.assertEqual(store.put("jean", "PERSON", "Paul"), "Paul")
+        self.assertEqual(store.put("jean", "PERSON", "Pierre"), "Paul")
+        store.put_many([(("marie", "PERSON"), "Anne"), (("sion", "CITY"), "Bulle")])
+        self.assertEqual(len(store), 2)
+        self.assertEqual(
+            store.get_many([("jean", "PERSON"), ("sion", "CITY")]), [None, "Bulle"]
+        )
+
+    def test_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pseudonyms.db")
+            first = SQLitePseudonymStore(path, max_size=1)
+            second = SQLitePseudonymStore(path)
+            first.put_many(
+                [(("jean", "PERSON"), "Paul"), (("marie", "PERSON"), "Anne")]
+            )
+            self.assertEqual(second.put("jean", "PERSON", "Pierre"), "Paul")
+            self.assertEqual(
+                second.get_many([("marie", "PERSON"), ("sion", "CITY")]),
+                ["Anne", None],
+            )
+            self.assertEqual(len(first), 2)
+            first.close()
+            second.close()
+
+            store = SQLitePseudonymStore(path)
+            self.assertEqual(store.get("marie", "PERSON"), "Anne")
+            store.clear()
+            self.assertEqual(len(store), 0)
+            store.close()
+
+    def test_operators(self):
+        config = gen_default_config()
+        config["flag_only"] = False
+        config["pseudonymize"] = ["EMAIL_ADDRESS"]
+        with tempfile.TemporaryDirectory() as tmp:
+            config["pseudonym_store_path"] = os.path.join(tmp, "pseudonyms.db")
+            first = make_pseudonym_store(config)
+            self.assertIsInstance(first, SQLitePseudonymStore)
+            fake = gen_operators(config, first)["EMAIL_ADDRESS"].params["lambda"]
+            email = fake("jean@example.com")
+
+            # Another operator set does not replace the store of the first one
+            config["pseudonym_store_path"] = None
+            memory = make_pseudonym_store(config)
+            other = gen_operators(config, memory)["EMAIL_ADDRESS"].params["lambda"]
+            self.assertNotEqual(other("jean@example.com"), email)
+            self.assertEqual(fake("jean@example.com"), email)
+            self.assertEqual(len(memory), 1)
+
+            config["pseudonym_store_path"] = os.path.join(tmp, "pseudonyms.db")
+            second = make_pseudonym_store(config)
+            fake = gen_operators(config, second)["EMAIL_ADDRESS"].params["lambda"]
+            self.assertEqual(fake("jean@example.com"), email)
+            first.close()
+            second.close()
+        self.assertEqual(len(get_pseudonym_store()), 0)
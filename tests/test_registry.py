@@ -0,0 +1,66 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import unittest
+
+from anonymization.pii import PIIDetection
+from anonymization.pii import registry
+
+
+class TestRegistry(unittest.TestCase):
+    def tearDown(self):
+        registry.evict()
+
+    def test_shared(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return object()
+
+        model = registry.acquire("model", "fr", loader)
+        self.assertIs(registry.acquire("model", "fr", loader), model)
+        self.assertIsNot(registry.acquire("model", "de", loader), model)
+        self.assertEqual(len(loads), 2)
+        self.assertEqual(registry.loaded_models()[("model", "fr")], 2)
+
+        registry.release("model", "fr", model)
+        self.assertEqual(registry.loaded_models()[("model", "fr")], 1)
+        registry.release("model", "fr", model)
+        self.assertNotIn(("model", "fr"), registry.loaded_models())
+
+    def test_evict(self):
+        model = registry.acquire("model", "fr", object)
+        registry.acquire("model", "de", object)
+        registry.acquire("other", "fr", object)
+        self.assertEqual(registry.evict(name="model"), 2)
+        self.assertEqual(list(registry.loaded_models()), [("other", "fr")])
+        registry.release("model", "fr", model)
+        self.assertEqual(registry.evict(), 1)
+
+        # Releasing the evicted copy does not release the new one
+        model = registry.acquire("model", "fr", object)
+        registry.evict()
+        copy = registry.acquire("model", "fr", object)
+        self.assertIsNot(copy, model)
+        registry.release("model", "fr", model)
+        self.assertEqual(registry.loaded_models()[("model", "fr")], 1)
+        registry.release("model", "fr", copy)
+        self.assertEqual(registry.loaded_models(), dict())
+
+    def test_lazy_loading(self):
+        detector = PIIDetection()
+        self.assertEqual(registry.loaded_models(), dict())
+        self.assertEqual(detector.analyse_batch(["", ""]), [[], []])
+        self.assertEqual(registry.loaded_models(), dict())
+
+
+if __name__ == "__main__":
+    unittest.main()
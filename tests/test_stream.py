@@ -0,0 +1,84 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import contextlib
+import io
+import json
+import time
+import unittest
+
+from anonymization.api.anonym_api import Anonymizer
+from anonymization.api.stream import anonymize_stream
+from anonymization.api.stream import micro_batches
+from tests.test_api import pattern_config
+
+
+def slow_lines():
+    yield "a"
+    yield "b"
+    time.sleep(0.5)
+    yield "c"
+
+
+def broken_lines():
+    yield "a"
+    raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "invalid start byte")
+
+
+class TestStream(unittest.TestCase):
+    def test_micro_batches(self):
+        lines = [str(i) for i in range(10)]
+        batches = list(micro_batches(iter(lines), batch_size=4))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual(sum(batches, []), lines)
+
+        # A slow stream does not delay the lines already read
+        batches = list(micro_batches(slow_lines(), batch_size=4, max_delay=0.1))
+        self.assertEqual(batches, [["a", "b"], ["c"]])
+
+        with self.assertRaises(UnicodeDecodeError):
+            list(micro_batches(broken_lines()))
+
+    def test_anonymize_stream(self):
+        anonymizer = Anonymizer(pattern_config())
+        records = [
+            {"id": i, "message": f"Ecrire à user{i}@example.com", "to": "x@example.com"}
+            for i in range(5)
+        ]
+        input = io.StringIO("".join(json.dumps(r) + "\n" for r in records))
+        output = io.StringIO()
+        anonymize_stream(
+            anonymizer, input, output, fields=["message", "missing"], batch_size=2
+        )
+        out = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([r["id"] for r in out], list(range(5)))
+        self.assertEqual(out[0]["message"], "Ecrire à <ANONYM_EMAIL>")
+        self.assertEqual(out[0]["to"], "x@example.com")
+
+        # An invalid line is dropped, not the whole batch
+        input = io.StringIO(
+            '{"message": "jean@example.com"}\n{"message": "marie@example.com\n\n'
+        )
+        output = io.StringIO()
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            anonymize_stream(anonymizer, input, output, batch_size=4)
+        self.assertEqual(output.getvalue(), '{"message": "<ANONYM_EMAIL>"}\n\n')
+        self.assertIn("Skipping invalid JSON line", err.getvalue())
+        self.assertNotIn("marie", err.getvalue())
+
+        input = io.StringIO("Ecrire à jean@example.com\n\nok\n")
+        output = io.StringIO()
+        anonymize_stream(anonymizer, input, output, stream_format="lines")
+        self.assertEqual(output.getvalue(), "Ecrire à <ANONYM_EMAIL>\n\nok\n")
+        anonymizer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
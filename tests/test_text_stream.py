@@ -0,0 +1,101 @@
+#
+# SPDX-FileCopyrightText: Copyright © 2023 Idiap Research Institute <contact@idiap.ch>
+#
+# SPDX-FileContributor: Théophile Gentilhomme <theophile.gentilhomme@idiap.ch>
+#
+# SPDX-License-Identifier: GPL-3.0-only
+#
+# anonymization: Text ner and pii
+#
+
+import os
+import tempfile
+import unittest
+
+from anonymization.api.anonym_api import Anonymizer
+from anonymization.api.journal import Journal
+from anonymization.api.text_stream import anonymize_text_stream
+from anonymization.api.text_stream import iter_segments
+from tests.test_api import pattern_config
+
+TEXT = (
+    "Bonjour,\nécrire à jean@example.com  .\n\n"
+    "\n  Deuxième paragraphe, sans données.\n \n"
+    "ligne 1 paul@example.com\nligne 2\nligne 3 été\n"
+)
+
+
+class TestTextStream(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmp.name, "text.txt")
+        self.output = os.path.join(self.tmp.name, "text_anonymized.txt")
+        with open(self.input, "w", encoding="utf-8") as file:
+            file.write(TEXT)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_iter_segments(self):
+        segments = list(iter_segments(self.input, max_size=20))
+        self.assertEqual("".join(text + sep for text, sep, _ in segments), TEXT)
+        self.assertEqual(
+            [text for text, _, _ in segments],
+            [
+                "Bonjour,",
+                "écrire à jean@example.com  .",
+                "Deuxième paragraphe, sans données.",
+                "ligne 1 paul@example.com",
+                "ligne 2",
+                "ligne 3 été",
+            ],
+        )
+        # Resume from the position after a segment
+        offset = segments[2][2]
+        self.assertEqual(list(iter_segments(self.input, 20, offset)), segments[3:])
+
+        open(self.input, "w").close()
+        self.assertEqual(list(iter_segments(self.input)), [])
+
+    def test_anonymize_text_stream(self):
+        anonymizer = Anonymizer(pattern_config())
+        anonymize_text_stream(self.input, self.output, anonymizer, batch_size=2)
+        with open(self.output, encoding="utf-8") as file:
+            out = file.read()
+        self.assertEqual(
+            out,
+            "Bonjour, écrire à <ANONYM_EMAIL>.\n\n"
+            "\n  Deuxième paragraphe, sans données.\n \n"
+            "ligne 1 <ANONYM_EMAIL> ligne 2 ligne 3 été\n",
+        )
+
+        # Interrupted after the first batch, with a partial write
+        journal = Journal(self.output)
+        journal.start()
+        anonymize_batch = anonymizer.anonymize_batch
+        calls = []
+
+        def interrupt(values):
+            calls.append(values)
+            if len(calls) == 2:
+                raise KeyboardInterrupt()
+            return anonymize_batch(values)
+
+        anonymizer.anonymize_batch = interrupt
+        with self.assertRaises(KeyboardInterrupt):
+            anonymize_text_stream(
+                self.input, self.output, anonymizer, batch_size=1, journal=journal
+            )
+        with open(self.output, "a") as file:
+            file.write("partial")
+        anonymizer.anonymize_batch = anonymize_batch
+        anonymize_text_stream(
+            self.input, self.output, anonymizer, journal=journal, resume=True
+        )
+        anonymizer.close()
+        with open(self.output, encoding="utf-8") as file:
+            self.assertEqual(file.read(), out)
+
+
+if __name__ == "__main__":
+    unittest.main()